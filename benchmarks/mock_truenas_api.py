@@ -0,0 +1,383 @@
+from base64 import b64encode
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from multiprocessing.managers import BaseManager
+from random import Random
+from struct import pack, unpack
+from threading import Lock, Thread
+from time import sleep
+
+API_PATH = "/api/v2.0"
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WEBSOCKET_OPCODE_TEXT = 0x1
+WEBSOCKET_OPCODE_CLOSE = 0x8
+WEBSOCKET_OPCODE_PING = 0x9
+WEBSOCKET_OPCODE_PONG = 0xA
+
+def matches_query_filter(item: dict, query_filter: list) -> bool:
+	if query_filter[0] == "OR":
+		return any(matches_query_filters(item, [nested_filter]) for nested_filter in query_filter[1])
+	key, operator, value = query_filter
+	item_value = item.get(key)
+	match operator:
+		case "=":
+			return item_value == value
+		case "!=":
+			return item_value != value
+		case "in":
+			return item_value in value
+		case "nin":
+			return item_value not in value
+		case "^":
+			return isinstance(item_value, str) and item_value.startswith(value)
+		case "$":
+			return isinstance(item_value, str) and item_value.endswith(value)
+	raise ValueError(f"Unsupported query filter operator '{operator}'")
+
+def matches_query_filters(item: dict, query_filters: list) -> bool:
+	return all(matches_query_filter(item, query_filter) for query_filter in query_filters)
+
+# NOTE: Stand-in for the parts of the TrueNAS REST API that are used by the APIManager
+class MockTrueNASAPI:
+	def __init__(self, latency_seconds: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+		self.latency_seconds = latency_seconds
+		self.error_rate = error_rate
+		self.random = Random(seed)
+		self.lock = Lock()
+		self.datasets: list[str] = []
+		self.shares: dict[int, dict] = {}
+		self.next_share_id = 1
+		self.jobs: dict[int, dict] = {}
+		self.next_job_id = 1
+		self.request_counts: dict[str, int] = {}
+		self.server = None
+
+	@property
+	def uri(self) -> str:
+		return f"http://127.0.0.1:{self.server.server_port}"
+
+	@property
+	def number_of_requests(self) -> int:
+		return sum(self.request_counts.values())
+
+	def reset_request_counts(self) -> None:
+		with self.lock:
+			self.request_counts = {}
+
+	# NOTE: Accessors for proxies of MockTrueNASAPIManager, which can only call methods
+	def get_uri(self) -> str:
+		return self.uri
+
+	def get_request_counts(self) -> dict[str, int]:
+		with self.lock:
+			return dict(self.request_counts)
+
+	def get_share_paths(self) -> set[str]:
+		with self.lock:
+			return {share["path"] for share in self.shares.values()}
+
+	def set_datasets(self, datasets: list[str]) -> None:
+		self.datasets = datasets
+
+	def set_error_rate(self, error_rate: float) -> None:
+		with self.lock:
+			self.error_rate = error_rate
+
+	def add_share(self, share_dict: dict) -> dict:
+		with self.lock:
+			share = {
+				"aliases": [],
+				"comment": "",
+				"hosts": [],
+				"ro": False,
+				"maproot_user": None,
+				"maproot_group": None,
+				"mapall_user": None,
+				"mapall_group": None,
+				"security": [],
+				"enabled": True,
+				"networks": [],
+				**share_dict,
+				"id": self.next_share_id,
+				"locked": False,
+			}
+			self.shares[share["id"]] = share
+			self.next_share_id += 1
+			return share
+
+	def start(self) -> None:
+		mock_api = self
+		class RequestHandler(MockTrueNASAPIRequestHandler):
+			api = mock_api
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+		self.server.daemon_threads = True
+		Thread(target=self.server.serve_forever, daemon=True).start()
+
+	def stop(self) -> None:
+		self.server.shutdown()
+		self.server.server_close()
+
+	def should_fail(self) -> bool:
+		with self.lock:
+			return self.error_rate > 0 and self.random.random() < self.error_rate
+
+	def count_request(self, method: str, endpoint: str) -> None:
+		# NOTE: Ids are stripped, so that all requests to the same kind of endpoint are counted together
+		endpoint_kind = "/".join("{id}" if part.isdigit() else part for part in endpoint.split("/"))
+		request_key = f"{method} {endpoint_kind}"
+		with self.lock:
+			self.request_counts[request_key] = self.request_counts.get(request_key, 0) + 1
+
+	def query(self, items: list[dict], query_body: dict | None) -> list[dict] | int:
+		query_body = query_body or {}
+		query_filters = query_body.get("query-filters") or []
+		query_options = query_body.get("query-options") or {}
+		if query_filters:
+			items = [item for item in items if matches_query_filters(item, query_filters)]
+		if query_options.get("count"):
+			return len(items)
+		for order_field in reversed(query_options.get("order_by") or []):
+			is_descending = order_field.startswith("-")
+			order_field = order_field.lstrip("-")
+			items = sorted(items, key=lambda item: item.get(order_field), reverse=is_descending)
+		offset = query_options.get("offset") or 0
+		limit = query_options.get("limit") or None
+		if offset or limit:
+			items = items[offset:offset + limit if limit else None]
+		selected_fields = query_options.get("select")
+		if selected_fields:
+			items = [{key: item[key] for key in selected_fields if key in item} for item in items]
+		return items
+
+	# NOTE: Maps each middleware method that can be called through core.bulk to (HTTP method, endpoint, body) of the REST API
+	def get_rest_call_for_method(self, method: str, params: list) -> tuple[str, str, dict | None]:
+		match method:
+			case "sharing.nfs.create":
+				return "POST", "/sharing/nfs", params[0]
+			case "sharing.nfs.update":
+				return "PUT", f"/sharing/nfs/id/{params[0]}", params[1]
+			case "sharing.nfs.delete":
+				return "DELETE", f"/sharing/nfs/id/{params[0]}", None
+		raise ValueError(f"Method '{method}' is not implemented by the mock")
+
+	def submit_bulk_job(self, method: str, params_list: list[list]) -> int:
+		with self.lock:
+			job = {"id": self.next_job_id, "method": "core.bulk", "state": "RUNNING", "result": None, "error": None}
+			self.jobs[job["id"]] = job
+			self.next_job_id += 1
+		Thread(target=self.run_bulk_job, args=(job, method, params_list), daemon=True).start()
+		return job["id"]
+
+	def run_bulk_job(self, job: dict, method: str, params_list: list[list]) -> None:
+		item_results = []
+		for params in params_list:
+			if self.latency_seconds > 0:
+				sleep(self.latency_seconds / 10)
+			if self.should_fail():
+				item_results.append({"job_id": None, "result": None, "error": "Injected failure"})
+				continue
+			status_code, item_result = self.handle(*self.get_rest_call_for_method(method, params))
+			if status_code == 200:
+				item_results.append({"job_id": None, "result": item_result, "error": None})
+			else:
+				item_results.append({"job_id": None, "result": None, "error": item_result.get("message")})
+		with self.lock:
+			job["result"] = item_results
+			job["state"] = "SUCCESS"
+
+	# NOTE: Maps each middleware method that can be called over the WebSocket to (HTTP method, endpoint, body) of the REST API
+	def get_rest_call_for_rpc(self, rpc_method: str, params: list) -> tuple[str, str, dict | None]:
+		query_endpoints = {
+			"api_key.query": "/api_key",
+			"pool.dataset.query": "/pool/dataset",
+			"sharing.nfs.query": "/sharing/nfs",
+			"core.get_jobs": "/core/get_jobs",
+		}
+		if rpc_method in query_endpoints:
+			query_filters = params[0] if len(params) > 0 else []
+			query_options = params[1] if len(params) > 1 else {}
+			return "GET", query_endpoints[rpc_method], {"query-filters": query_filters, "query-options": query_options}
+		if rpc_method == "core.bulk":
+			return "POST", "/core/bulk", {"method": params[0], "params": params[1]}
+		return self.get_rest_call_for_method(rpc_method, params)
+
+	def handle_rpc(self, request_message: dict) -> dict:
+		rpc_method = request_message["method"]
+		response_message = {"jsonrpc": "2.0", "id": request_message["id"]}
+		self.count_request("RPC", rpc_method)
+		if self.latency_seconds > 0:
+			sleep(self.latency_seconds)
+		if rpc_method == "auth.login_with_api_key":
+			response_message["result"] = True
+			return response_message
+		if self.should_fail():
+			response_message["error"] = {"code": -32603, "message": "Injected failure"}
+			return response_message
+		try:
+			status_code, result = self.handle(*self.get_rest_call_for_rpc(rpc_method, request_message.get("params") or []))
+		except ValueError as ex:
+			response_message["error"] = {"code": -32601, "message": str(ex)}
+			return response_message
+		if status_code == 200:
+			response_message["result"] = result
+		else:
+			response_message["error"] = {"code": -32001, "message": result.get("message"), "data": result}
+		return response_message
+
+	# NOTE: Like the middleware, only the pool root datasets are serialized before filtering, if children are not retrieved,
+	#   unless a single dataset is looked up by id or name
+	def get_dataset_items(self, query_body: dict | None) -> list[dict]:
+		query_body = query_body or {}
+		query_filters = query_body.get("query-filters") or []
+		extra = (query_body.get("query-options") or {}).get("extra") or {}
+		is_single_lookup = len(query_filters) == 1 and len(query_filters[0]) == 3 and query_filters[0][0] in ("id", "name") and query_filters[0][1] == "="
+		datasets = self.datasets
+		if not extra.get("retrieve_children", True) and not is_single_lookup:
+			datasets = [dataset for dataset in datasets if "/" not in dataset]
+		return [{"id": dataset, "name": dataset} for dataset in datasets]
+
+	# NOTE: Returns (status code, response body)
+	def handle(self, method: str, endpoint: str, body: dict | None) -> tuple[int, object]:
+		if endpoint == "/api_key":
+			return 200, [{"id": 1, "name": "benchmark"}]
+		if endpoint == "/pool/dataset" and method == "GET":
+			return 200, self.query(self.get_dataset_items(body), body)
+		if endpoint.rstrip("/") == "/sharing/nfs":
+			if method == "GET":
+				with self.lock:
+					shares = list(self.shares.values())
+				return 200, self.query(shares, body)
+			if method == "POST":
+				return 200, self.add_share(body)
+		if endpoint.startswith("/sharing/nfs/id/"):
+			share_id = int(endpoint.rstrip("/").rsplit("/", 1)[-1])
+			with self.lock:
+				share = self.shares.get(share_id)
+				if share is None:
+					return 404, {"message": f"Share {share_id} does not exist"}
+				if method == "PUT":
+					share.update(body)
+					return 200, share
+				if method == "DELETE":
+					del self.shares[share_id]
+					return 200, True
+		if endpoint == "/core/bulk" and method == "POST":
+			return 200, self.submit_bulk_job(body["method"], body["params"])
+		if endpoint == "/core/get_jobs" and method == "GET":
+			with self.lock:
+				jobs = [dict(job) for job in self.jobs.values()]
+			return 200, self.query(jobs, body)
+		return 404, {"message": f"{method} {endpoint} is not implemented by the mock"}
+
+class MockTrueNASAPIRequestHandler(BaseHTTPRequestHandler):
+	api: MockTrueNASAPI = None
+	protocol_version = "HTTP/1.1"
+	# NOTE: Headers and body are written separately, which would otherwise wait for the delayed ACK of the client on keep-alive connections
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	def read_websocket_frame(self) -> tuple[int, bytes]:
+		first_byte, second_byte = self.rfile.read(2)
+		opcode = first_byte & 0x0F
+		payload_length = second_byte & 0x7F
+		if payload_length == 126:
+			payload_length = unpack("!H", self.rfile.read(2))[0]
+		elif payload_length == 127:
+			payload_length = unpack("!Q", self.rfile.read(8))[0]
+		# NOTE: Frames sent by clients are always masked
+		mask = self.rfile.read(4) if second_byte & 0x80 else b"\x00\x00\x00\x00"
+		payload = self.rfile.read(payload_length)
+		return opcode, bytes(payload_byte ^ mask[byte_index % 4] for byte_index, payload_byte in enumerate(payload))
+
+	def write_websocket_frame(self, opcode: int, payload: bytes) -> None:
+		if len(payload) < 126:
+			header = pack("!BB", 0x80 | opcode, len(payload))
+		elif len(payload) < 2**16:
+			header = pack("!BBH", 0x80 | opcode, 126, len(payload))
+		else:
+			header = pack("!BBQ", 0x80 | opcode, 127, len(payload))
+		with self.websocket_send_lock:
+			self.wfile.write(header + payload)
+			self.wfile.flush()
+
+	# NOTE: Each call is handled in its own thread, so that pipelined calls are answered out of order, like by the middleware
+	def handle_websocket(self):
+		websocket_key = self.headers["Sec-WebSocket-Key"]
+		accept_key = b64encode(sha1(f"{websocket_key}{WEBSOCKET_GUID}".encode()).digest()).decode()
+		self.send_response(101, "Switching Protocols")
+		self.send_header("Upgrade", "websocket")
+		self.send_header("Connection", "Upgrade")
+		self.send_header("Sec-WebSocket-Accept", accept_key)
+		self.end_headers()
+		self.wfile.flush()
+		self.websocket_send_lock = Lock()
+
+		def respond(request_message: dict):
+			self.write_websocket_frame(WEBSOCKET_OPCODE_TEXT, dumps(self.api.handle_rpc(request_message)).encode())
+		while True:
+			try:
+				opcode, payload = self.read_websocket_frame()
+			except (OSError, ValueError):
+				break
+			if opcode == WEBSOCKET_OPCODE_CLOSE:
+				self.write_websocket_frame(WEBSOCKET_OPCODE_CLOSE, b"")
+				break
+			if opcode == WEBSOCKET_OPCODE_PING:
+				self.write_websocket_frame(WEBSOCKET_OPCODE_PONG, payload)
+			elif opcode == WEBSOCKET_OPCODE_TEXT:
+				Thread(target=respond, args=(loads(payload),), daemon=True).start()
+		self.close_connection = True
+
+	def handle_request(self):
+		if self.headers.get("Upgrade", "").lower() == "websocket":
+			return self.handle_websocket()
+		endpoint = self.path.split("?", 1)[0]
+		if endpoint.startswith(API_PATH):
+			endpoint = endpoint[len(API_PATH):]
+		content_length = int(self.headers.get("Content-Length") or 0)
+		body = loads(self.rfile.read(content_length)) if content_length > 0 else None
+
+		self.api.count_request(self.command, endpoint)
+		if self.api.latency_seconds > 0:
+			sleep(self.api.latency_seconds)
+		if self.api.should_fail():
+			status_code, response_body = 503, {"message": "Injected failure"}
+		else:
+			status_code, response_body = self.api.handle(self.command, endpoint, body)
+
+		response_bytes = dumps(response_body).encode()
+		self.send_response(status_code)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(response_bytes)))
+		self.end_headers()
+		self.wfile.write(response_bytes)
+
+	do_GET = handle_request
+	do_POST = handle_request
+	do_PUT = handle_request
+	do_DELETE = handle_request
+
+# NOTE: Runs mocks in a separate process, so that their server threads neither compete with the benchmarked process
+#   nor are included in the memory it traces
+class MockTrueNASAPIManager(BaseManager):
+	pass
+
+MockTrueNASAPIManager.register("MockTrueNASAPI", MockTrueNASAPI, exposed=(
+	"start", "stop", "reset_request_counts", "get_uri", "get_request_counts", "get_share_paths", "set_datasets", "set_error_rate",
+))
+
+# NOTE: Returns (list[str], list[str]):
+#   1. All datasets, including those of an unrelated pool that is not shared
+#   2. The share roots the datasets are distributed across
+def generate_datasets(number_of_datasets: int, number_of_roots: int = 10, unrelated_fraction: float = 0.25) -> tuple[list[str], list[str]]:
+	share_roots = [f"tank/share-{root_index}" for root_index in range(number_of_roots)]
+	datasets = ["tank", *share_roots]
+	number_of_unrelated_datasets = int(number_of_datasets * unrelated_fraction)
+	datasets.extend(f"backup/dataset-{dataset_index}" for dataset_index in range(number_of_unrelated_datasets))
+	for dataset_index in range(number_of_datasets - len(datasets)):
+		share_root = share_roots[dataset_index % number_of_roots]
+		datasets.append(f"{share_root}/dataset-{dataset_index}")
+	return datasets, share_roots
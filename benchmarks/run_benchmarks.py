@@ -0,0 +1,215 @@
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from importlib.util import module_from_spec, spec_from_file_location
+from json import dump
+from munch import Munch, munchify
+from os import O_WRONLY, close, devnull, dup, dup2, open as open_file_descriptor
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+import sys
+import tracemalloc
+
+from benchmarks.mock_truenas_api import API_PATH, MockTrueNASAPI, MockTrueNASAPIManager, generate_datasets
+from helpers.args import parser as tool_parser
+from helpers.constants import MOUNT_PREFIX
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+
+def load_main() -> Callable:
+	# NOTE: The entry point cannot be imported regularly, as its file name contains a hyphen
+	module_spec = spec_from_file_location("recursive_nfs", REPOSITORY_ROOT / "recursive-nfs.py")
+	module = module_from_spec(module_spec)
+	module_spec.loader.exec_module(module)
+	return module.main
+
+# NOTE: Output is redirected on the file descriptor level, since the spinners keep references to the original streams
+@contextmanager
+def suppressed_output():
+	sys.stdout.flush()
+	sys.stderr.flush()
+	devnull_file_descriptor = open_file_descriptor(devnull, O_WRONLY)
+	original_file_descriptors = [dup(1), dup(2)]
+	dup2(devnull_file_descriptor, 1)
+	dup2(devnull_file_descriptor, 2)
+	try:
+		yield
+	finally:
+		sys.stdout.flush()
+		sys.stderr.flush()
+		dup2(original_file_descriptors[0], 1)
+		dup2(original_file_descriptors[1], 2)
+		for file_descriptor in [devnull_file_descriptor, *original_file_descriptors]:
+			close(file_descriptor)
+
+@dataclass
+class BenchmarkResult:
+	scenario: str
+	number_of_datasets: int
+	succeeded: bool
+	# NOTE: Whether the shares after the run match the relevant datasets, e.g. to detect datasets that were not discovered
+	shares_match_datasets: bool
+	wall_seconds: float
+	number_of_requests: int
+	peak_memory_bytes: int
+	request_counts: dict[str, int]
+
+class BenchmarkRunner:
+	def __init__(self, benchmark_args):
+		self.benchmark_args = benchmark_args
+		self.main = load_main()
+
+	def create_config(self, mock_api: MockTrueNASAPI, share_roots: list[str]) -> Munch:
+		return munchify({
+			"truenas": {
+				"api": {
+					"host": mock_api.get_uri(),
+					"path": API_PATH,
+					"key": "benchmark",
+					"transport": self.benchmark_args.transport,
+				},
+			},
+			"shares": share_roots,
+			"share_options": {
+				"default": {
+					"networks": [],
+					"hosts": ["192.168.0.10", "192.168.0.11"],
+					"ro": False,
+					"maproot_user": "root",
+					"maproot_group": "wheel",
+					"mapall_user": None,
+					"mapall_group": None,
+				},
+				"custom": {},
+			},
+		})
+
+	def get_tool_cli_args(self) -> list[str]:
+		# NOTE: All prompts are confirmed, so that the tool runs non-interactively
+		tool_cli_args = ["--headless", "--yes"]
+		if self.benchmark_args.concurrency is not None:
+			tool_cli_args += ["--concurrency", str(self.benchmark_args.concurrency)]
+		if self.benchmark_args.bulk_size is not None:
+			tool_cli_args += ["--bulk-size", str(self.benchmark_args.bulk_size)]
+		return tool_cli_args
+
+	# NOTE: Returns (bool, float, int): the result of main(), its wall time and its peak traced memory (0, if it is not measured).
+	#   As the mock API runs in a separate process, only the memory allocated by the tool is traced
+	def run_main(self, config: Munch, measure_memory: bool = False) -> tuple[bool, float, int]:
+		tool_args = tool_parser.parse_args(self.get_tool_cli_args())
+		if measure_memory:
+			tracemalloc.start()
+		with suppressed_output():
+			start_time = perf_counter()
+			succeeded = self.main(tool_args, config)
+			wall_seconds = perf_counter() - start_time
+		peak_memory_bytes = 0
+		if measure_memory:
+			peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+		return succeeded, wall_seconds, peak_memory_bytes
+
+	def run_prepared_scenario(self, scenario_name: str, datasets: list[str], share_roots: list[str], measure_memory: bool) -> BenchmarkResult:
+		with MockTrueNASAPIManager() as mock_api_manager:
+			mock_api = mock_api_manager.MockTrueNASAPI(
+				latency_seconds=self.benchmark_args.latency_ms / 1000,
+				error_rate=self.benchmark_args.error_rate,
+			)
+			mock_api.set_datasets(datasets)
+			mock_api.start()
+			try:
+				config = self.create_config(mock_api, share_roots)
+				prepare_scenario = SCENARIOS[scenario_name]
+				prepare_scenario(self, mock_api, config)
+				mock_api.reset_request_counts()
+				succeeded, wall_seconds, peak_memory_bytes = self.run_main(config, measure_memory)
+				request_counts = mock_api.get_request_counts()
+				return BenchmarkResult(
+					scenario=scenario_name,
+					number_of_datasets=len(datasets),
+					succeeded=succeeded,
+					shares_match_datasets=do_shares_match_datasets(mock_api, datasets, config),
+					wall_seconds=wall_seconds,
+					number_of_requests=sum(request_counts.values()),
+					peak_memory_bytes=peak_memory_bytes,
+					request_counts=request_counts,
+				)
+			finally:
+				mock_api.stop()
+
+	# NOTE: Tracing memory slows the tool down several times, so the peak memory is measured in a second run of the scenario
+	def run_scenario(self, scenario_name: str, number_of_datasets: int) -> BenchmarkResult:
+		datasets, share_roots = generate_datasets(number_of_datasets)
+		result = self.run_prepared_scenario(scenario_name, datasets, share_roots, measure_memory=False)
+		result.peak_memory_bytes = self.run_prepared_scenario(scenario_name, datasets, share_roots, measure_memory=True).peak_memory_bytes
+		return result
+
+	def perform_initial_sync(self, mock_api: MockTrueNASAPI, config: Munch) -> None:
+		# NOTE: Failures are not injected while preparing a scenario
+		mock_api.set_error_rate(0)
+		succeeded, _, _ = self.run_main(config)
+		mock_api.set_error_rate(self.benchmark_args.error_rate)
+		if not succeeded:
+			raise Exception("The initial sync for the benchmark scenario failed")
+
+def do_shares_match_datasets(mock_api: MockTrueNASAPI, datasets: list[str], config: Munch) -> bool:
+	expected_share_paths = {f"{MOUNT_PREFIX}{dataset}" for dataset in datasets if any(dataset.startswith(share_root) for share_root in config.shares)}
+	return mock_api.get_share_paths() == expected_share_paths
+
+def prepare_cold_sync(runner: BenchmarkRunner, mock_api: MockTrueNASAPI, config: Munch) -> None:
+	pass
+
+def prepare_steady_state(runner: BenchmarkRunner, mock_api: MockTrueNASAPI, config: Munch) -> None:
+	runner.perform_initial_sync(mock_api, config)
+
+def prepare_mass_delete(runner: BenchmarkRunner, mock_api: MockTrueNASAPI, config: Munch) -> None:
+	runner.perform_initial_sync(mock_api, config)
+	config.shares = config.shares[:1]
+
+def prepare_config_change(runner: BenchmarkRunner, mock_api: MockTrueNASAPI, config: Munch) -> None:
+	runner.perform_initial_sync(mock_api, config)
+	config.share_options.default.ro = True
+
+SCENARIOS = {
+	"cold-sync": prepare_cold_sync,
+	"steady-state": prepare_steady_state,
+	"mass-delete": prepare_mass_delete,
+	"config-change": prepare_config_change,
+}
+
+def print_results(results: list[BenchmarkResult]) -> None:
+	print(f"{'scenario':<16}{'datasets':>10}{'result':>8}{'wall [s]':>12}{'requests':>10}{'peak [MiB]':>12}")
+	for result in results:
+		result_text = "failed" if not result.succeeded else "ok" if result.shares_match_datasets else "wrong"
+		print(
+			f"{result.scenario:<16}{result.number_of_datasets:>10}{result_text:>8}"
+			f"{result.wall_seconds:>12.3f}{result.number_of_requests:>10}{result.peak_memory_bytes / 2**20:>12.1f}"
+		)
+
+def obtain_benchmark_args():
+	benchmark_parser = ArgumentParser(
+		description="Benchmarks recursive-nfs.py against a mock of the TrueNAS API that runs in a separate process. Run from the repository root: python -m benchmarks.run_benchmarks",
+		formatter_class=ArgumentDefaultsHelpFormatter,
+	)
+	benchmark_parser.add_argument("--sizes", type=str, default="1000,10000", help="comma-separated numbers of datasets to benchmark each scenario with, e.g. 1000,10000,100000")
+	benchmark_parser.add_argument("--scenarios", type=str, default=",".join(SCENARIOS.keys()), help="comma-separated scenarios to run")
+	benchmark_parser.add_argument("--latency-ms", type=float, default=0.0, help="latency the mock API adds to every request")
+	benchmark_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests the mock API answers with 503")
+	benchmark_parser.add_argument("--concurrency", type=int, default=None, help="passed to the tool as --concurrency")
+	benchmark_parser.add_argument("--bulk-size", type=int, default=None, help="passed to the tool as --bulk-size")
+	benchmark_parser.add_argument("--transport", type=str, choices=["rest", "websocket"], default="rest", help="API transport the tool is configured to use")
+	benchmark_parser.add_argument("--json", type=str, metavar="file", default=None, help="path to write the results to as JSON, e.g. to compare them between versions")
+	return benchmark_parser.parse_args()
+
+if __name__ == "__main__":
+	benchmark_args = obtain_benchmark_args()
+	runner = BenchmarkRunner(benchmark_args)
+	results = []
+	for number_of_datasets in [int(size) for size in benchmark_args.sizes.split(",")]:
+		for scenario_name in benchmark_args.scenarios.split(","):
+			results.append(runner.run_scenario(scenario_name, number_of_datasets))
+	print_results(results)
+	if benchmark_args.json is not None:
+		with open(benchmark_args.json, "w") as file_handle:
+			dump([asdict(result) for result in results], file_handle, indent=4)
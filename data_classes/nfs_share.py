@@ -1,12 +1,23 @@
-from dataclasses import asdict, dataclass, field
-from typing import Self
-from requests import Response
+from dataclasses import dataclass, field, fields
+from hashlib import sha256
+from json import dumps
+from operator import attrgetter
+from sys import intern
+from typing import Collection, Self
 
 import helpers.global_fields as g
 
 from helpers.constants import AUTOCREATE_COMMENT_SUFFIX, MOUNT_PREFIX
 
-@dataclass
+# NOTE: The order of these list fields is not significant to the share and is ignored when comparing shares
+UNORDERED_LIST_FIELDS = ("hosts", "networks", "security")
+# NOTE: The same few hosts, networks, users and comments repeat across all shares, so each distinct string is only kept once
+INTERNED_LIST_FIELDS = ("hosts", "networks")
+INTERNED_FIELDS = ("comment", "maproot_user", "maproot_group", "mapall_user", "mapall_group")
+# NOTE: Fields that are returned by the API, but cannot be sent when creating or updating a share
+READ_ONLY_FIELDS = ("id", "locked")
+
+@dataclass(slots=True)
 class NFSShare:
 	path: str
 	id: int = None
@@ -22,29 +33,42 @@ class NFSShare:
 	enabled: bool = True
 	networks: list[str] = field(default_factory=list)
 	locked: bool | None = None
+	# NOTE: Fields returned by the API that are unknown to this version (e.g. of newer TrueNAS versions).
+	#   They are kept to reproduce the share in as_dict, but are neither sent nor compared
+	extra_fields: dict | None = field(default=None, repr=False, compare=False)
+
+	def __post_init__(self):
+		for interned_list_field in INTERNED_LIST_FIELDS:
+			values = getattr(self, interned_list_field)
+			if values:
+				setattr(self, interned_list_field, [intern(value) if isinstance(value, str) else value for value in values])
+		for interned_field in INTERNED_FIELDS:
+			value = getattr(self, interned_field)
+			if isinstance(value, str):
+				setattr(self, interned_field, intern(value))
 
 	@classmethod
-	def list_from_api_response(cls: Self, api_response: Response) -> list[Self]:
-		dataset_json_array = api_response.json()
-		return [cls.from_json_dict(dataset_json_dict) for dataset_json_dict in dataset_json_array]
+	def list_from_json_array(cls: Self, share_json_array: list[dict]) -> list[Self]:
+		return [cls.from_json_dict(share_json_dict) for share_json_dict in share_json_array]
 
 	@classmethod
 	def from_json_dict(cls: Self, json_dict: dict) -> Self:
-		return cls(**json_dict)
+		unknown_field_names = json_dict.keys() - SHARE_FIELD_NAMES
+		if not unknown_field_names:
+			return cls(**json_dict)
+		known_fields = {key: value for key, value in json_dict.items() if key not in unknown_field_names}
+		extra_fields = {key: json_dict[key] for key in unknown_field_names}
+		return cls(**known_fields, extra_fields=extra_fields)
 	
 	@classmethod
 	def from_config_options(cls: Self, path_without_prefix: str) -> Self:
 		path = f"{MOUNT_PREFIX}{path_without_prefix}"
-		custom_options_dict = g.config.share_options.custom.get(path_without_prefix)
-
-		options_dict = {}
-		if custom_options_dict is None:
-			options_dict = g.config.share_options.default
-		else:
-			options_dict = dict(custom_options_dict)
-			for default_option_key, default_option_value in g.config.share_options.default.items():
-				if default_option_key not in options_dict.keys():
-					options_dict[default_option_key] = default_option_value
+		resolved_options = g.share_options_table.resolve(path_without_prefix)
+		# NOTE: The resolved options are shared between shares, so frozen lists are copied for each share
+		options_dict = {
+			option_key: list(option_value) if isinstance(option_value, tuple) else option_value
+			for option_key, option_value in resolved_options.options.items()
+		}
 
 		new_share = cls(path=path, **options_dict)
 		new_share.set_comment_for_automatically_created_flag(new_share.comment)
@@ -54,24 +78,44 @@ class NFSShare:
 	def path_name(self):
 		return self.path[len(MOUNT_PREFIX):] if self.path.startswith(MOUNT_PREFIX) else self.path
 	
+	# NOTE: The returned dicts share their lists with the share, so they must not be modified
 	def as_dict(self):
-		return asdict(self)
+		share_dict = dict(zip(SHARE_FIELD_NAMES, get_share_field_values(self)))
+		if self.extra_fields:
+			share_dict.update(self.extra_fields)
+		return share_dict
 	
 	def as_create_dict(self):
-		limited_dict = self.as_dict()
-		keys_to_remove = [
-			"id",
-			"locked"
+		return dict(zip(CREATE_FIELD_NAMES, get_create_field_values(self)))
+	
+	def as_normalized_create_dict(self):
+		normalized_dict = self.as_create_dict()
+		for unordered_list_field in UNORDERED_LIST_FIELDS:
+			normalized_dict[unordered_list_field] = sorted(normalized_dict[unordered_list_field] or [], key=str)
+		normalized_dict["comment"] = " ".join((normalized_dict["comment"] or "").split())
+		return normalized_dict
+
+	def get_content_hash(self) -> str:
+		normalized_json = dumps(self.as_normalized_create_dict(), sort_keys=True, default=str)
+		return sha256(normalized_json.encode()).hexdigest()[:16]
+
+	def get_changed_fields(self, present_share: Self) -> list[str]:
+		present_dict = present_share.as_normalized_create_dict()
+		return [
+			key for key, value in self.as_normalized_create_dict().items()
+				if present_dict.get(key) != value
 		]
-		for key_to_remove in keys_to_remove:
-			del limited_dict[key_to_remove]
-		return limited_dict
 	
 	def is_automatically_created(self):
 		return self.comment.endswith(AUTOCREATE_COMMENT_SUFFIX)
 	
-	def is_relevant(self, relevant_datasets_list: list[str]):
-		return self.path_name in relevant_datasets_list
+	def is_relevant(self, relevant_datasets: Collection[str]):
+		return self.path_name in relevant_datasets
 	
 	def set_comment_for_automatically_created_flag(self, comment: str = None):
-		self.comment = f"{comment} {AUTOCREATE_COMMENT_SUFFIX}" if comment else AUTOCREATE_COMMENT_SUFFIX
\ No newline at end of file
+		self.comment = f"{comment} {AUTOCREATE_COMMENT_SUFFIX}" if comment else AUTOCREATE_COMMENT_SUFFIX
+
+SHARE_FIELD_NAMES = tuple(share_field.name for share_field in fields(NFSShare) if share_field.name != "extra_fields")
+CREATE_FIELD_NAMES = tuple(field_name for field_name in SHARE_FIELD_NAMES if field_name not in READ_ONLY_FIELDS)
+get_share_field_values = attrgetter(*SHARE_FIELD_NAMES)
+get_create_field_values = attrgetter(*CREATE_FIELD_NAMES)
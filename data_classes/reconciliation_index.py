@@ -0,0 +1,48 @@
+from data_classes.nfs_share import NFSShare
+
+class DatasetPrefixTrie:
+	# NOTE: Marks the end of a configured prefix inside the character trie
+	TERMINAL_KEY = None
+
+	def __init__(self, prefixes: list[str]):
+		self.root = {}
+		for prefix in prefixes:
+			node = self.root
+			for character in prefix:
+				node = node.setdefault(character, {})
+			node[self.TERMINAL_KEY] = True
+
+	# NOTE: Equivalent to any(dataset.startswith(prefix) for prefix in prefixes), but in O(len(dataset))
+	def matches(self, dataset: str) -> bool:
+		node = self.root
+		if self.TERMINAL_KEY in node:
+			return True
+		for character in dataset:
+			node = node.get(character)
+			if node is None:
+				return False
+			if self.TERMINAL_KEY in node:
+				return True
+		return False
+
+class ReconciliationIndex:
+	def __init__(self, all_shares: list[NFSShare], relevant_datasets: list[str]):
+		self.relevant_datasets = set(relevant_datasets)
+		self.automatically_created_shares_by_path: dict[str, NFSShare] = {}
+		self.relevant_automatically_created_shares: list[NFSShare] = []
+		self.irrelevant_automatically_created_shares: list[NFSShare] = []
+		self.non_automatic_relevant_shares: list[NFSShare] = []
+
+		for share in all_shares:
+			is_relevant = share.is_relevant(self.relevant_datasets)
+			if not share.is_automatically_created():
+				if is_relevant:
+					self.non_automatic_relevant_shares.append(share)
+			elif is_relevant:
+				self.relevant_automatically_created_shares.append(share)
+				self.automatically_created_shares_by_path.setdefault(share.path_name, share)
+			else:
+				self.irrelevant_automatically_created_shares.append(share)
+
+	def get_datasets_needing_new_shares(self, relevant_datasets: list[str]) -> list[str]:
+		return [dataset for dataset in relevant_datasets if dataset not in self.automatically_created_shares_by_path]
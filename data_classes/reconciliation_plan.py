@@ -0,0 +1,60 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Self
+
+from data_classes.nfs_share import NFSShare
+from data_classes.reconciliation_index import ReconciliationIndex
+from helpers.console import Fore
+
+@dataclass
+class ShareUpdate:
+	present_share: NFSShare
+	desired_share: NFSShare
+	changed_fields: list[str]
+
+@dataclass
+class ReconciliationPlan:
+	shares_to_create: list[NFSShare] = field(default_factory=list)
+	share_updates: list[ShareUpdate] = field(default_factory=list)
+	shares_to_delete: list[NFSShare] = field(default_factory=list)
+	unchanged_shares: list[NFSShare] = field(default_factory=list)
+	non_automatic_relevant_shares: list[NFSShare] = field(default_factory=list)
+
+	@classmethod
+	def from_index(cls: Self, index: ReconciliationIndex, relevant_datasets: list[str]) -> Self:
+		plan = cls(
+			shares_to_create=[
+				NFSShare.from_config_options(dataset)
+				for dataset in index.get_datasets_needing_new_shares(relevant_datasets)
+			],
+			shares_to_delete=index.irrelevant_automatically_created_shares,
+			non_automatic_relevant_shares=index.non_automatic_relevant_shares,
+		)
+		for present_share in index.relevant_automatically_created_shares:
+			desired_share = NFSShare.from_config_options(present_share.path_name)
+			desired_share.id = present_share.id
+			changed_fields = desired_share.get_changed_fields(present_share)
+			if changed_fields:
+				plan.share_updates.append(ShareUpdate(present_share, desired_share, changed_fields))
+			else:
+				plan.unchanged_shares.append(present_share)
+		return plan
+
+	@property
+	def shares_to_update(self) -> list[NFSShare]:
+		return [share_update.desired_share for share_update in self.share_updates]
+
+	def print_summary(self) -> None:
+		changed_field_counter = Counter(
+			changed_field
+			for share_update in self.share_updates
+				for changed_field in share_update.changed_fields
+		)
+		changed_fields_text = ", ".join(f"{changed_field}: {count}" for changed_field, count in changed_field_counter.most_common())
+		print(f"{Fore.CYAN}Plan:{Fore.RESET}")
+		print(f"\t+ {len(self.shares_to_create)} to create")
+		print(f"\t~ {len(self.share_updates)} to update" + (f" ({changed_fields_text})" if changed_fields_text else ""))
+		print(f"\t- {len(self.shares_to_delete)} to delete")
+		print(f"\t= {len(self.unchanged_shares)} unchanged")
+		if self.non_automatic_relevant_shares:
+			print(f"\t! {len(self.non_automatic_relevant_shares)} relevant shares that have not been automatically created")
@@ -0,0 +1,97 @@
+from json import dumps, loads
+from os import remove
+from threading import Lock
+from typing import Self
+
+from data_classes.nfs_share import NFSShare
+from data_classes.share_operation import ShareOperation
+from data_classes.share_operation_result import ShareOperationResult
+from helpers.constants import RESUME_JOURNAL_VERSION
+
+# NOTE: Append-only log of the share operations of a run, one JSON object per line:
+#   {"entry": "header", "version", "config_hash"}, followed by
+#   {"entry": "planned" | "completed", "operation", "path", "id"} for each operation.
+#   Each line is written as soon as the operation was planned or completed, so that the journal survives a crash of the run
+class ResumeJournal:
+	def __init__(self, file_path: str, config_hash: str):
+		self.file_path = file_path
+		self.config_hash = config_hash
+		# NOTE: Map (operation, path) to the id of the share
+		self.planned_operations: dict[tuple[ShareOperation, str], int | None] = {}
+		self.completed_operations: dict[tuple[ShareOperation, str], int | None] = {}
+		self.lock = Lock()
+
+	@classmethod
+	def start(cls: Self, file_path: str, config_hash: str) -> Self:
+		journal = cls(file_path, config_hash)
+		with open(file_path, "w") as file_handle:
+			file_handle.write(dumps({ "entry": "header", "version": RESUME_JOURNAL_VERSION, "config_hash": config_hash }) + "\n")
+		return journal
+
+	# NOTE: Returns None, if the file does not exist or was written by an incompatible version.
+	#   A partially written last line, e.g. of a run that was killed, is ignored
+	@classmethod
+	def load(cls: Self, file_path: str) -> Self | None:
+		try:
+			with open(file_path, "r") as file_handle:
+				lines = file_handle.read().splitlines()
+			header = loads(lines[0])
+		except (OSError, ValueError, IndexError):
+			return None
+		if header.get("entry") != "header" or header.get("version") != RESUME_JOURNAL_VERSION:
+			return None
+
+		journal = cls(file_path, header["config_hash"])
+		for line in lines[1:]:
+			try:
+				journal_entry = loads(line)
+				operation_key = (ShareOperation(journal_entry["operation"]), journal_entry["path"])
+			except (ValueError, KeyError):
+				continue
+			match journal_entry.get("entry"):
+				case "planned":
+					journal.planned_operations[operation_key] = journal_entry.get("id")
+				case "completed":
+					journal.completed_operations[operation_key] = journal_entry.get("id")
+		return journal
+
+	def append_entries(self, journal_entries: list[dict]) -> None:
+		if not journal_entries:
+			return
+		with self.lock, open(self.file_path, "a") as file_handle:
+			file_handle.write("".join(dumps(journal_entry) + "\n" for journal_entry in journal_entries))
+
+	# NOTE: Operations that were planned before are not recorded again
+	def record_planned(self, operation: ShareOperation, shares: list[NFSShare]) -> None:
+		journal_entries = []
+		for share in shares:
+			operation_key = (operation, share.path)
+			if operation_key in self.planned_operations:
+				continue
+			self.planned_operations[operation_key] = share.id
+			journal_entries.append({ "entry": "planned", "operation": operation.value, "path": share.path, "id": share.id })
+		self.append_entries(journal_entries)
+
+	def record_completed(self, operation: ShareOperation, share: NFSShare, share_id: int | None) -> None:
+		self.completed_operations[(operation, share.path)] = share_id
+		self.append_entries([{ "entry": "completed", "operation": operation.value, "path": share.path, "id": share_id }])
+
+	def record_result(self, operation: ShareOperation, result: ShareOperationResult) -> None:
+		if not result.succeeded:
+			return
+		# NOTE: Creations and updates return the resulting share, deletions only whether they succeeded
+		share_id = result.result["id"] if isinstance(result.result, dict) and "id" in result.result else result.share.id
+		self.record_completed(operation, result.share, share_id)
+
+	# NOTE: Returns the (operation, path) and id of each planned operation that was not completed, in the order they were planned
+	def get_remaining_operations(self) -> list[tuple[tuple[ShareOperation, str], int | None]]:
+		return [
+			(operation_key, share_id) for operation_key, share_id in self.planned_operations.items()
+				if operation_key not in self.completed_operations
+		]
+
+	def remove(self) -> None:
+		try:
+			remove(self.file_path)
+		except FileNotFoundError:
+			pass
@@ -0,0 +1,22 @@
+from enum import Enum
+
+from data_classes.nfs_share import NFSShare
+
+class ShareOperation(Enum):
+	CREATE = "create"
+	UPDATE = "update"
+	DELETE = "delete"
+
+	@property
+	def bulk_method(self) -> str:
+		return f"sharing.nfs.{self.value}"
+
+	# NOTE: Parameters of the middleware method, as passed to core.bulk for each share
+	def get_bulk_params(self, share: NFSShare) -> list:
+		match self:
+			case ShareOperation.CREATE:
+				return [share.as_create_dict()]
+			case ShareOperation.UPDATE:
+				return [share.id, share.as_create_dict()]
+			case ShareOperation.DELETE:
+				return [share.id]
@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+from data_classes.nfs_share import NFSShare
+
+@dataclass
+class ShareOperationResult:
+	share: NFSShare
+	# NOTE: The decoded result returned by the API, e.g. the created share
+	result: object = None
+	error: str | None = None
+
+	@property
+	def succeeded(self) -> bool:
+		return self.error is None
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Self
+
+# NOTE: Origin of options that are not overridden by any custom entry
+DEFAULT_OPTIONS_SOURCE = "default"
+
+@dataclass(frozen=True)
+class ResolvedShareOptions:
+	options: Mapping[str, object]
+	# NOTE: Maps each option to the custom entry it was inherited from, or to DEFAULT_OPTIONS_SOURCE
+	sources: Mapping[str, str]
+
+	@classmethod
+	def from_layer(cls: Self, parent: Self | None, layer_options: Mapping[str, object], layer_source: str) -> Self:
+		options = dict(parent.options) if parent is not None else {}
+		sources = dict(parent.sources) if parent is not None else {}
+		for option_key, option_value in (layer_options or {}).items():
+			# NOTE: Lists are frozen, so that the resolved options can be shared by all shares of a subtree
+			options[option_key] = tuple(option_value) if isinstance(option_value, list) else option_value
+			sources[option_key] = layer_source
+		return cls(MappingProxyType(options), MappingProxyType(sources))
+
+class ShareOptionsTable:
+	# NOTE: Key of the resolved options inside a node of the dataset component trie
+	RESOLVED_KEY = None
+
+	# NOTE: Options of share_options.custom apply to the configured dataset and all of its descendants.
+	#   Each option is taken from the nearest configured ancestor that sets it, and otherwise from share_options.default.
+	#   All entries are resolved once, so that looking up the options of a dataset only walks its path components
+	def __init__(self, share_options: Mapping):
+		self.default_options = ResolvedShareOptions.from_layer(None, share_options.get("default"), DEFAULT_OPTIONS_SOURCE)
+		self.root = {self.RESOLVED_KEY: self.default_options}
+		self.resolved_entries: dict[str, ResolvedShareOptions] = {}
+
+		custom_options = share_options.get("custom") or {}
+		# NOTE: Sorting by depth resolves every ancestor before its descendants
+		for dataset in sorted(custom_options.keys(), key=lambda dataset: dataset.count("/")):
+			node = self.root
+			inherited_options = self.default_options
+			for path_component in dataset.strip("/").split("/"):
+				node = node.setdefault(path_component, {})
+				inherited_options = node.get(self.RESOLVED_KEY, inherited_options)
+			node[self.RESOLVED_KEY] = ResolvedShareOptions.from_layer(inherited_options, custom_options[dataset], dataset)
+			self.resolved_entries[dataset] = node[self.RESOLVED_KEY]
+
+	def resolve(self, dataset: str) -> ResolvedShareOptions:
+		node = self.root
+		resolved_options = self.default_options
+		for path_component in dataset.split("/"):
+			node = node.get(path_component)
+			if node is None:
+				break
+			resolved_options = node.get(self.RESOLVED_KEY, resolved_options)
+		return resolved_options
+
+	def print_explanation(self, relevant_datasets: list[str]) -> None:
+		datasets_per_entry: dict[int, int] = {}
+		for dataset in relevant_datasets:
+			resolved_options = self.resolve(dataset)
+			datasets_per_entry[id(resolved_options)] = datasets_per_entry.get(id(resolved_options), 0) + 1
+
+		print("Effective share options:")
+		for entry_name, resolved_options in [(DEFAULT_OPTIONS_SOURCE, self.default_options), *self.resolved_entries.items()]:
+			print(f"\t{entry_name} (applies to {datasets_per_entry.get(id(resolved_options), 0)} datasets):")
+			for option_key, option_value in resolved_options.options.items():
+				option_source = resolved_options.sources[option_key]
+				source_note = "" if option_source == entry_name else f"  (from {option_source})"
+				print(f"\t\t{option_key}: {list(option_value) if isinstance(option_value, tuple) else option_value!r}{source_note}")
@@ -0,0 +1,34 @@
+from dataclasses import asdict, dataclass, field
+from json import dump, load
+from os import replace
+from typing import Self
+
+from helpers.constants import STATE_SNAPSHOT_VERSION
+
+@dataclass
+class StateSnapshot:
+	config_hash: str
+	datasets: list[str] = field(default_factory=list)
+	# NOTE: Ids of all NFS shares present on the system, including those that have not been created automatically
+	share_ids: list[int] = field(default_factory=list)
+	# NOTE: Maps the path name of each automatically created share to its [id, content hash]
+	shares: dict[str, list] = field(default_factory=dict)
+	version: int = STATE_SNAPSHOT_VERSION
+
+	# NOTE: Returns None, if the file does not exist or was written by an incompatible version
+	@classmethod
+	def load(cls: Self, file_path: str) -> Self | None:
+		try:
+			with open(file_path, "r") as file_handle:
+				snapshot_dict = load(file_handle)
+			snapshot = cls(**snapshot_dict)
+		except (OSError, ValueError, TypeError):
+			return None
+		return snapshot if snapshot.version == STATE_SNAPSHOT_VERSION else None
+
+	# NOTE: The snapshot is written to a temporary file first, so that an interrupted write cannot leave a corrupt snapshot behind
+	def save(self, file_path: str) -> None:
+		temporary_file_path = f"{file_path}.tmp"
+		with open(temporary_file_path, "w") as file_handle:
+			dump(asdict(self), file_handle, separators=(",", ":"))
+		replace(temporary_file_path, file_path)
@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from functools import cached_property
+from munch import Munch
+from os import path
+
+from data_classes.resume_journal import ResumeJournal
+from data_classes.share_options_table import ShareOptionsTable
+from data_classes.state_snapshot import StateSnapshot
+from helpers.metrics import MetricsCollector
+from modules.api import APIManager
+
+# NOTE: All state of the reconciliation of a single TrueNAS host. See helpers/global_fields.py for how it is accessed
+@dataclass
+class TargetContext:
+	name: str
+	args: object
+	config: Munch
+	is_only_target: bool = True
+	api_manager: APIManager = None
+	metrics: MetricsCollector = field(default_factory=MetricsCollector)
+	journal: ResumeJournal = None
+	succeeded: bool | None = None
+	duration_seconds: float = 0.0
+	# NOTE: Kept between the cycles of watch mode, so that each cycle only needs to handle what changed since the previous one
+	state_snapshot: StateSnapshot = None
+	zfs_list_output_lines: list[str] | None = None
+
+	# NOTE: Resolved once per target, as the share options of a target do not change during a run
+	@cached_property
+	def share_options_table(self) -> ShareOptionsTable:
+		return ShareOptionsTable(self.config.share_options)
+
+	def close_api_manager(self) -> None:
+		if self.api_manager is not None:
+			self.api_manager.close()
+			self.api_manager = None
+
+	# NOTE: After a failed cycle of watch mode, the next cycle reconnects and performs a full sync
+	def discard_warm_state(self) -> None:
+		self.close_api_manager()
+		self.state_snapshot = None
+
+	# NOTE: Files like the state snapshot are kept per target, if there are multiple targets
+	def get_file_path(self, file_path: str | None) -> str | None:
+		if file_path is None or self.is_only_target:
+			return file_path
+		file_path_root, file_extension = path.splitext(file_path)
+		return f"{file_path_root}.{self.name}{file_extension}"
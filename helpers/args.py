@@ -1,5 +1,7 @@
 from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
 
+from helpers.constants import DEFAULT_WATCH_DEBOUNCE_SECONDS, DEFAULT_WATCH_INTERVAL_SECONDS
+
 parser = ArgumentParser(
     description="truenas-recursive-nfs-share: Pseudo-recursive NFS share creation for TrueNAS. Copy config-example.yaml to config.yaml and make appropriate changes. This tool expects the list of present datasets via STDIN. Sample invocation: zfs list -o name > python3 truenas-recursive-nfs-share.py",
     formatter_class=ArgumentDefaultsHelpFormatter,
@@ -8,9 +10,38 @@ parser = ArgumentParser(
 task_group = parser.add_argument_group("io", description="Arguments to specify I/O")
 task_group.add_argument("--config", "-c", type=str, metavar="file", default="./config.yaml", help="path to the config file to read")
 
-datasets_source_group = parser.add_argument_group("datasets-source", description="Arguments to specify the source from which dataset information is gathered. The default source is a (slow) API query")
+datasets_source_group = parser.add_argument_group("datasets-source", description="Arguments to specify the source from which dataset information is gathered. The default source is an API query limited to the configured share roots")
 datasets_source_group.add_argument("--stdin", "-s", action="store_true", default=False, help="flag to specify that the dataset source is the output of zfs list -o name piped or manually entered into the STDIN handle. If neither this nor --datasets-file is provided, the API endpoint is used as a default")
 datasets_source_group.add_argument("--datasets-file", "-d", type=str, metavar="file", default=None, help="path to the file containing output of 'zfs list -o name'. If neither a file nor --stdin is provided, the API endpoint is used as a default")
+datasets_source_group.add_argument("--datasets-columns", type=str, metavar="columns", default=None, help="comma-separated columns of headerless output, e.g. 'name,mountpoint,type' for 'zfs list -H -o name,mountpoint,type'. If omitted, the output is expected to start with a header row. Datasets that are not of type 'filesystem' are skipped, if a type column is present. Dataset names containing spaces require tab-separated columns (zfs list -H), unless only the name column is listed")
+
+execution_group = parser.add_argument_group("execution", description="Arguments to specify how share changes are applied")
+execution_group.add_argument("--concurrency", "-j", type=int, metavar="N", default=None, help="maximum number of share requests that are sent to the API concurrently. Overrides truenas.api.concurrency from the config file (default: 8)")
+execution_group.add_argument("--bulk-size", type=int, metavar="N", default=None, help="group up to N creations, updates or deletions into a single core.bulk job instead of sending one request per share. Overrides truenas.api.bulk_size from the config file (default: 0, disabled)")
+execution_group.add_argument("--page-size", type=int, metavar="N", default=None, help="number of datasets and shares requested per page when querying the API. Overrides truenas.api.page_size from the config file (default: 5000, 0 requests everything at once)")
+execution_group.add_argument("--yes", "-y", action="store_true", default=False, help="answer all prompts to create, update and delete shares with yes, except for deleting manually created shares")
+execution_group.add_argument("--assume-no-deletes", action="store_true", default=False, help="answer all prompts to delete shares with no and continue with updating and creating shares. Takes precedence over --yes and --delete-manual-shares")
+execution_group.add_argument("--delete-manual-shares", action="store_true", default=False, help="answer the prompt to delete relevant shares that were not created automatically with yes. Without it, --yes and --headless decline this prompt")
+execution_group.add_argument("--headless", action="store_true", default=False, help="print plain lines without spinners or colors and never wait for input. Prompts that are not answered by --yes or --assume-no-deletes are declined")
+execution_group.add_argument("--explain-options", action="store_true", default=False, help="print the effective options of the default and each custom entry of share_options, where each option was inherited from and how many datasets it applies to")
+execution_group.add_argument("--plan-only", action="store_true", default=False, help="only print which shares would be created, updated and deleted, without changing anything")
+
+state_group = parser.add_argument_group("state", description="Arguments to specify incremental runs based on a state snapshot")
+state_group.add_argument("--state-file", type=str, metavar="file", default=None, help="path to a state snapshot that is written after each successful run. Subsequent runs only reconcile datasets and options that changed since then. If omitted, every run performs a full sync")
+state_group.add_argument("--full-sync", action="store_true", default=False, help="ignore the state snapshot and reconcile all datasets and shares. The snapshot is still rewritten afterwards")
+
+state_group.add_argument("--journal-file", type=str, metavar="file", default=None, help="path to a journal to which all planned and completed share operations are appended while they are applied. It is removed once a run succeeded")
+state_group.add_argument("--resume", action="store_true", default=False, help="continue the interrupted run recorded in --journal-file: only its remaining operations are checked against the present shares and applied, without discovering datasets again")
+
+watch_group = parser.add_argument_group("watch", description="Arguments to keep running and reconcile whenever datasets may have changed. The connection and a state snapshot are kept in memory, so that each cycle only handles what changed since the previous one")
+watch_group.add_argument("--watch", action="store_true", default=False, help="keep running and reconcile periodically, on changes of --watch-trigger-file, on SIGHUP or SIGUSR1, or (with --stdin) for every output of zfs list that is followed by an empty line. Implies --headless; changes are only applied with --yes")
+watch_group.add_argument("--watch-interval", type=float, metavar="seconds", default=DEFAULT_WATCH_INTERVAL_SECONDS, help="seconds between cycles, if nothing triggered one before")
+watch_group.add_argument("--watch-trigger-file", type=str, metavar="file", default=None, help="path to a file whose modification triggers a cycle, e.g. touched by a script whenever datasets are created")
+watch_group.add_argument("--watch-debounce", type=float, metavar="seconds", default=DEFAULT_WATCH_DEBOUNCE_SECONDS, help="seconds without further triggers to wait for before a cycle starts, so that bursts of changes are handled together")
+
+metrics_group = parser.add_argument_group("metrics", description="Arguments to specify where timing and request metrics are exported to. A summary is always printed at the end of a run")
+metrics_group.add_argument("--metrics-json", type=str, metavar="file", default=None, help="path to write phase durations and per-endpoint request metrics to as JSON. Time spent answering prompts is reported as the prompt_wait phase instead of the phase it occurred in")
+metrics_group.add_argument("--metrics-prometheus", type=str, metavar="file", default=None, help="path to write metrics to in the Prometheus text format, e.g. into the directory of the node_exporter textfile collector (*.prom)")
 
 def obtain_args():
     return parser.parse_args()
\ No newline at end of file
@@ -1,2 +1,31 @@
+import helpers.console as console
+import helpers.global_fields as g
+
 def is_input_prompt_positive(response_input : str):
-    return response_input.lower().startswith("y")
\ No newline at end of file
+    return response_input.lower().startswith("y")
+
+# NOTE: Prompts are answered by the --yes, --assume-no-deletes and --delete-manual-shares policies first. In headless mode, remaining prompts are declined.
+#   Deleting manually created shares is never accepted by --yes, only by --delete-manual-shares or when answered interactively
+def confirm(prompt_text: str, default: bool = False, is_deletion: bool = False, is_manual_share_deletion: bool = False) -> bool:
+    if (is_deletion or is_manual_share_deletion) and g.args.assume_no_deletes:
+        print(f"{prompt_text} n (--assume-no-deletes)")
+        return False
+    if is_manual_share_deletion:
+        if g.args.delete_manual_shares:
+            print(f"{prompt_text} y (--delete-manual-shares)")
+            return True
+        if g.args.yes or console.is_headless:
+            print(f"{prompt_text} n (manual shares are only deleted with --delete-manual-shares)")
+            return False
+    elif g.args.yes:
+        print(f"{prompt_text} y (--yes)")
+        return True
+    if console.is_headless:
+        print(f"{prompt_text} n (headless without --yes)")
+        return False
+    options_text = "[y]/n" if default else "y/[n]"
+    with g.metrics.prompt_wait():
+        response_input = input(f"\n{prompt_text} {options_text}: ")
+    if not response_input:
+        return default
+    return is_input_prompt_positive(response_input)
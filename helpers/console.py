@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from threading import Lock, local
+from typing import Callable
+import sys
+
+# NOTE: In headless mode, output consists of plain lines without colors or spinners
+is_headless = False
+
+def set_headless(headless: bool) -> None:
+    global is_headless
+    is_headless = headless
+
+# NOTE: Drop-in replacement for colorama.Fore, which defers importing colorama until a color is first used
+class LazyFore:
+    def __getattr__(self, color_name: str) -> str:
+        if is_headless:
+            return ""
+        from colorama import Fore as colorama_fore
+        return getattr(colorama_fore, color_name)
+
+Fore = LazyFore()
+
+# NOTE: Prefixes every line written to the wrapped stream, e.g. with the name of the target the writing thread reconciles.
+#   Partial lines are buffered per thread, so that lines of parallel threads are not mixed up
+class PrefixedLineStream:
+    def __init__(self, stream, get_prefix: Callable[[], str]):
+        self.stream = stream
+        self.get_prefix = get_prefix
+        self.lock = Lock()
+        self.thread_buffers = local()
+
+    def write(self, text: str) -> int:
+        buffered_text = getattr(self.thread_buffers, "text", "") + text
+        *lines, self.thread_buffers.text = buffered_text.split("\n")
+        if lines:
+            prefix = self.get_prefix()
+            with self.lock:
+                self.stream.write("".join(f"{prefix}{line}\n" for line in lines))
+        return len(text)
+
+    def flush(self) -> None:
+        buffered_text = getattr(self.thread_buffers, "text", "")
+        self.thread_buffers.text = ""
+        with self.lock:
+            if buffered_text:
+                self.stream.write(f"{self.get_prefix()}{buffered_text}")
+            self.stream.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+@contextmanager
+def prefixed_output_lines(get_prefix: Callable[[], str]):
+    original_stdout = sys.stdout
+    sys.stdout = PrefixedLineStream(original_stdout, get_prefix)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stdout = original_stdout
@@ -1,2 +1,21 @@
 AUTOCREATE_COMMENT_SUFFIX = "(automatically created)"
-MOUNT_PREFIX = "/mnt/"
\ No newline at end of file
+MOUNT_PREFIX = "/mnt/"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 10
+DEFAULT_READ_TIMEOUT_SECONDS = 60
+DEFAULT_REQUEST_RETRIES = 3
+DEFAULT_RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+STATE_SNAPSHOT_VERSION = 1
+RESUME_JOURNAL_VERSION = 1
+BULK_JOB_POLL_INITIAL_INTERVAL_SECONDS = 0.1
+BULK_JOB_POLL_MAX_INTERVAL_SECONDS = 2.0
+BULK_JOB_FINISHED_STATES = ("SUCCESS", "FAILED", "ABORTED")
+# NOTE: Number of consecutive polls after which a job that is missing from core.get_jobs is considered lost
+BULK_JOB_MAX_MISSING_POLLS = 5
+DEFAULT_WEBSOCKET_PATH = "/api/current"
+DEFAULT_PAGE_SIZE = 5000
+DEFAULT_WATCH_INTERVAL_SECONDS = 60
+DEFAULT_WATCH_DEBOUNCE_SECONDS = 2.0
+WATCH_MAX_DEBOUNCE_DELAY_SECONDS = 30
+WATCH_TRIGGER_FILE_POLL_INTERVAL_SECONDS = 1.0
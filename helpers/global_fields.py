@@ -1,7 +1,21 @@
-from modules.api import APIManager
+from contextvars import ContextVar
 
+from data_classes.target_context import TargetContext
 
-args = None
-config = None
+TARGET_FIELDS = ("args", "config", "api_manager", "metrics", "journal", "share_options_table")
 
-api_manager: APIManager = None
\ No newline at end of file
+current_target: ContextVar[TargetContext] = ContextVar("current_target")
+
+def activate_target(target: TargetContext) -> None:
+    current_target.set(target)
+
+# NOTE: args, config, api_manager, metrics, journal and share_options_table are looked up on the target that is active in the current context,
+#   so that multiple targets can be reconciled in parallel threads without sharing any state.
+#   Threads that access them need to run in a copy of the context, see contextvars.copy_context
+def __getattr__(name: str):
+    if name == "target":
+        return current_target.get(None)
+    if name in TARGET_FIELDS:
+        target = current_target.get(None)
+        return getattr(target, name) if target is not None else None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
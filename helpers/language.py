@@ -1,6 +1,10 @@
-from inflect import engine as plural_engine_generator
+from functools import cache
 
-plural_engine = plural_engine_generator()
+@cache
+def get_plural_engine():
+    # NOTE: inflect is slow to import and only needed for output, so it is imported on first use
+    from inflect import engine as plural_engine_generator
+    return plural_engine_generator()
 
 def pl(noun : str, quantity : int):
-    return plural_engine.plural_noun(noun, quantity)
\ No newline at end of file
+    return get_plural_engine().plural_noun(noun, quantity)
@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from json import dump
+from os import replace
+from re import sub
+from threading import Lock
+from time import perf_counter, time
+
+METRICS_PREFIX = "truenas_recursive_nfs"
+# NOTE: Time spent waiting for answers to interactive prompts, which is excluded from the phases it occurred in
+PROMPT_WAIT_PHASE_NAME = "prompt_wait"
+
+@dataclass
+class RequestMetric:
+    method: str
+    endpoint: str
+    # NOTE: None, if no response was received
+    status: int | None
+    latency_seconds: float
+    response_bytes: int
+
+@dataclass
+class RequestMetricsSummary:
+    method: str
+    endpoint: str
+    count: int = 0
+    errors: int = 0
+    total_latency_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+    response_bytes: int = 0
+
+    @property
+    def mean_latency_seconds(self) -> float:
+        return self.total_latency_seconds / self.count if self.count else 0.0
+
+def get_endpoint_kind(endpoint: str) -> str:
+    # NOTE: Share ids are replaced, so that requests to the same kind of endpoint are aggregated
+    return sub(r"/\d+(?=/|$)", "/{id}", endpoint)
+
+class MetricsCollector:
+    def __init__(self):
+        self.lock = Lock()
+        self.phase_durations: dict[str, float] = {}
+        self.request_metrics: list[RequestMetric] = []
+
+    @contextmanager
+    def phase(self, phase_name: str):
+        start_time = perf_counter()
+        with self.lock:
+            start_prompt_wait = self.phase_durations.get(PROMPT_WAIT_PHASE_NAME, 0.0)
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start_time
+            with self.lock:
+                duration -= self.phase_durations.get(PROMPT_WAIT_PHASE_NAME, 0.0) - start_prompt_wait
+                self.phase_durations[phase_name] = self.phase_durations.get(phase_name, 0.0) + duration
+
+    @contextmanager
+    def prompt_wait(self):
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start_time
+            with self.lock:
+                self.phase_durations[PROMPT_WAIT_PHASE_NAME] = self.phase_durations.get(PROMPT_WAIT_PHASE_NAME, 0.0) + duration
+
+    def record_request(self, method: str, endpoint: str, status: int | None, latency_seconds: float, response_bytes: int) -> None:
+        request_metric = RequestMetric(method, get_endpoint_kind(endpoint), status, latency_seconds, response_bytes)
+        with self.lock:
+            self.request_metrics.append(request_metric)
+
+    def get_request_summaries(self) -> list[RequestMetricsSummary]:
+        request_summaries: dict[tuple[str, str], RequestMetricsSummary] = {}
+        with self.lock:
+            request_metrics = list(self.request_metrics)
+        for request_metric in request_metrics:
+            summary_key = (request_metric.method, request_metric.endpoint)
+            request_summary = request_summaries.get(summary_key)
+            if request_summary is None:
+                request_summary = request_summaries[summary_key] = RequestMetricsSummary(*summary_key)
+            request_summary.count += 1
+            if request_metric.status is None or request_metric.status >= 400:
+                request_summary.errors += 1
+            request_summary.total_latency_seconds += request_metric.latency_seconds
+            request_summary.max_latency_seconds = max(request_summary.max_latency_seconds, request_metric.latency_seconds)
+            request_summary.response_bytes += request_metric.response_bytes
+        return list(request_summaries.values())
+
+    def print_summary(self) -> None:
+        print(f"\n{'phase':<32}{'duration [s]':>14}")
+        for phase_name, duration in self.phase_durations.items():
+            print(f"{phase_name:<32}{duration:>14.3f}")
+
+        request_summaries = self.get_request_summaries()
+        if not request_summaries:
+            return
+        print(f"\n{'request':<32}{'count':>8}{'errors':>8}{'mean [ms]':>12}{'max [ms]':>12}{'bytes':>12}")
+        for request_summary in request_summaries:
+            request_name = f"{request_summary.method} {request_summary.endpoint}"
+            print(
+                f"{request_name:<32}{request_summary.count:>8}{request_summary.errors:>8}"
+                f"{request_summary.mean_latency_seconds * 1000:>12.1f}{request_summary.max_latency_seconds * 1000:>12.1f}{request_summary.response_bytes:>12}"
+            )
+
+    def as_dict(self, succeeded: bool) -> dict:
+        return {
+            "succeeded": succeeded,
+            "timestamp": time(),
+            "phases": dict(self.phase_durations),
+            "requests": [
+                {
+                    **asdict(request_summary),
+                    "mean_latency_seconds": request_summary.mean_latency_seconds,
+                }
+                for request_summary in self.get_request_summaries()
+            ],
+        }
+
+    def write_json(self, file_path: str, succeeded: bool) -> None:
+        with open(file_path, "w") as file_handle:
+            dump(self.as_dict(succeeded), file_handle, indent=4)
+
+    # NOTE: Written in the text format of the node_exporter textfile collector. The file is replaced atomically,
+    #   so that the collector never reads a partially written file
+    #   Common labels, like the target with multiple targets, are added to every series
+    def write_prometheus(self, file_path: str, succeeded: bool, common_labels: dict[str, str] | None = None) -> None:
+        def format_labels(labels: dict[str, str]) -> str:
+            labels = {**(common_labels or {}), **labels}
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{label_name}="{label_value}"' for label_name, label_value in labels.items()) + "}"
+
+        lines = [
+            f"# HELP {METRICS_PREFIX}_last_run_success Whether the last run succeeded",
+            f"# TYPE {METRICS_PREFIX}_last_run_success gauge",
+            f"{METRICS_PREFIX}_last_run_success{format_labels({})} {int(succeeded)}",
+            f"# HELP {METRICS_PREFIX}_last_run_timestamp_seconds Time the last run finished",
+            f"# TYPE {METRICS_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRICS_PREFIX}_last_run_timestamp_seconds{format_labels({})} {time():.3f}",
+            f"# HELP {METRICS_PREFIX}_phase_duration_seconds Duration of each phase of the last run",
+            f"# TYPE {METRICS_PREFIX}_phase_duration_seconds gauge",
+        ]
+        lines += [
+            f'{METRICS_PREFIX}_phase_duration_seconds{format_labels({"phase": phase_name})} {duration:.6f}'
+            for phase_name, duration in self.phase_durations.items()
+        ]
+
+        request_metric_types = [
+            ("api_requests", "count", "Number of API requests of the last run"),
+            ("api_request_errors", "errors", "Number of failed API requests of the last run"),
+            ("api_request_latency_total_seconds", "total_latency_seconds", "Total latency of API requests of the last run"),
+            ("api_request_latency_max_seconds", "max_latency_seconds", "Maximum latency of API requests of the last run"),
+            ("api_response_bytes", "response_bytes", "Size of API responses of the last run"),
+        ]
+        request_summaries = self.get_request_summaries()
+        for metric_name, summary_field, metric_help in request_metric_types:
+            lines.append(f"# HELP {METRICS_PREFIX}_{metric_name} {metric_help}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{metric_name} gauge")
+            lines += [
+                f'{METRICS_PREFIX}_{metric_name}{format_labels({"method": request_summary.method, "endpoint": request_summary.endpoint})} {getattr(request_summary, summary_field)}'
+                for request_summary in request_summaries
+            ]
+
+        temporary_file_path = f"{file_path}.tmp"
+        with open(temporary_file_path, "w") as file_handle:
+            file_handle.write("\n".join(lines) + "\n")
+        replace(temporary_file_path, file_path)
+
+# NOTE: With multiple targets, the metrics of each target are written to their own files and labelled with the target
+def export_metrics(args, targets: list["TargetContext"]) -> None:
+    for target in targets:
+        if not target.is_only_target:
+            print(f"\nMetrics of {target.name}:")
+        target.metrics.print_summary()
+        succeeded = bool(target.succeeded)
+        if args.metrics_json is not None:
+            target.metrics.write_json(target.get_file_path(args.metrics_json), succeeded)
+        if args.metrics_prometheus is not None:
+            common_labels = None if target.is_only_target else {"target": target.name}
+            target.metrics.write_prometheus(target.get_file_path(args.metrics_prometheus), succeeded, common_labels)
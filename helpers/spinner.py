@@ -1,12 +1,44 @@
 from functools import wraps
+from time import perf_counter
 
-from halo import Halo
+import helpers.console as console
 
-def spinner(text: str = "Loading") -> Halo:
+# NOTE: Stand-in for Halo in headless mode, which only prints a single line once the task finished
+class LineSpinner:
+    def __init__(self, text: str = "Loading"):
+        self.text = text
+        self.start_time = perf_counter()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self, text: str = None):
+        if text is not None:
+            self.text = text
+        return self
+
+    def stop(self):
+        return self
+
+    def print_line(self, status: str, text: str = None):
+        print(f"[{status}] {text or self.text} ({perf_counter() - self.start_time:.3f}s)")
+        return self
+
+    def succeed(self, text: str = None):
+        return self.print_line("ok", text)
+
+    def fail(self, text: str = None):
+        return self.print_line("failed", text)
+
+def spinner(text: str = "Loading"):
     def halo_fail_on_exception_wrapper(f: callable):
         @wraps(f)
         def halo_fail_on_exception_execution(*args, **kwargs):
-            print(f"> {text}")
+            if not console.is_headless:
+                print(f"> {text}")
             spinner = spinner_generator(text)
             try:
                 result = f(*args, **kwargs)
@@ -18,5 +50,8 @@ def spinner(text: str = "Loading") -> Halo:
         return halo_fail_on_exception_execution
     return halo_fail_on_exception_wrapper
 
-def spinner_generator(text: str = "Loading") -> Halo:
-    return Halo(text=text, spinner='dots')
\ No newline at end of file
+def spinner_generator(text: str = "Loading"):
+    if console.is_headless:
+        return LineSpinner(text)
+    from halo import Halo
+    return Halo(text=text, spinner='dots')
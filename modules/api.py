@@ -1,12 +1,51 @@
-from requests import Response, delete, get, post, put
+from requests import Response
+from time import perf_counter
+from typing import Iterator
 
 import helpers.global_fields as g
 
 from data_classes.nfs_share import NFSShare
+from data_classes.share_operation import ShareOperation
+from helpers.constants import DEFAULT_CONNECT_TIMEOUT_SECONDS, DEFAULT_PAGE_SIZE, DEFAULT_READ_TIMEOUT_SECONDS
 from helpers.spinner import spinner
+from modules.executor import get_concurrency
+from modules.transport import create_http_session
+
+def get_dataset_prefix_query_filters(dataset_roots: list[str]) -> list:
+	prefix_filters = [["id", "^", dataset_root] for dataset_root in dataset_roots]
+	if len(prefix_filters) <= 1:
+		return prefix_filters
+	return [["OR", prefix_filters]]
+
+# NOTE: A page size of 0 disables pagination, so that each query is answered by a single response
+def get_page_size() -> int:
+	if g.args.page_size is not None:
+		page_size = g.args.page_size
+	else:
+		page_size = g.config.truenas.api.get("page_size", DEFAULT_PAGE_SIZE)
+	if page_size < 0:
+		raise Exception(f"The page size must not be negative, but {page_size} was configured")
+	return page_size
+
+def create_transport(api_config):
+	transport_name = api_config.get("transport", "rest")
+	match transport_name:
+		case "rest":
+			return create_http_session(api_config, api_config.get("pool_size", get_concurrency()))
+		case "websocket":
+			# NOTE: Imported on demand, so that websocket-client is only required if this transport is selected
+			from modules.websocket_transport import WebSocketTransport
+			return WebSocketTransport(api_config)
+	raise Exception(f"Unknown API transport '{transport_name}' configured, expected 'rest' or 'websocket'")
+
+# NOTE: Raised when the API answers a query with an error status
+class APIQueryError(Exception):
+	pass
 
 class APIManager:
-	def __init__(self):
+	# NOTE: If no transport is passed, it is created as configured in truenas.api.transport
+	def __init__(self, transport=None):
+		self.transport = transport
 		self.update_config_values()
 		
 	def update_config_values(self) -> None:
@@ -17,49 +56,122 @@ class APIManager:
 			"Authorization": f"Bearer {self.api_key}",
 		}
 		self.uri_prefix = f"{api_config.host}{api_config.path}"
+		self.request_timeout = (
+			api_config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT_SECONDS),
+			api_config.get("read_timeout", DEFAULT_READ_TIMEOUT_SECONDS),
+		)
+		if self.transport is None:
+			self.transport = create_transport(api_config)
+
+	# NOTE: Both the requests session and the WebSocket transport hold open connections until they are closed
+	def close(self) -> None:
+		self.transport.close()
 
 	def get_uri(self, endpoint: str) -> str:
 		return f"{self.uri_prefix}{endpoint}"
 
-	def perform_request(self, request_method: callable, endpoint: str, json_body: dict | None = None, query_params: dict = None) -> Response:
+	def perform_request(self, request_method: str, endpoint: str, json_body: dict | None = None, query_params: dict = None) -> Response:
 		body_kwarg = { "json": json_body } if json_body else {}
 		query_kwarg = { "params": query_params } if query_params else {}
-		return request_method(
-			self.get_uri(endpoint),
-			headers=self.request_headers,
-			**body_kwarg,
-			**query_kwarg,
-		)
+		start_time = perf_counter()
+		try:
+			response = self.transport.request(
+				request_method,
+				self.get_uri(endpoint),
+				headers=self.request_headers,
+				timeout=self.request_timeout,
+				**body_kwarg,
+				**query_kwarg,
+			)
+		except Exception:
+			g.metrics.record_request(request_method, endpoint, None, perf_counter() - start_time, 0)
+			raise
+		g.metrics.record_request(request_method, endpoint, response.status_code, perf_counter() - start_time, len(response.content))
+		return response
 	
-	def perform_nfs_request(self, request_method: callable, endpoint: str = "", body: dict | None = None) -> Response:
+	def perform_nfs_request(self, request_method: str, endpoint: str = "", body: dict | None = None) -> Response:
 		return self.perform_request(request_method, f"/sharing/nfs/{endpoint}", body)
 
 	@spinner("Checking if API is accessible")
 	def check_api_availability(self) -> bool:
 		try:
-			api_key_response = self.perform_request(get, "/api_key")
+			api_key_response = self.perform_request("GET", "/api_key")
 			return len(api_key_response.json()) > 0
 		except:
 			return False
 		
-	@spinner("Retrieving available datasets")
-	def get_available_datasets_query_response(self) -> bool:
-		# TODO: Implement query filters for better performance
-		return self.perform_request(get, "/pool/dataset", query_params={
-			"extra.properties": "['id']",
-			"extra.flat": "true",
-			"extra.retrieve_children": "true",
-		})
+	# NOTE: Yields the items of a query one page at a time, so that only a single page of the response is held in memory.
+	#   The items are ordered by id, so that the pages do not overlap
+	def iterate_query_pages(self, endpoint: str, query_filters: list | None = None, query_options: dict | None = None) -> Iterator[list[dict]]:
+		page_size = get_page_size()
+		offset = 0
+		while True:
+			page_query_options = dict(query_options or {})
+			if page_size > 0:
+				page_query_options.update({ "order_by": ["id"], "limit": page_size, "offset": offset })
+			query_response = self.perform_request("GET", endpoint, json_body={
+				"query-filters": query_filters or [],
+				"query-options": page_query_options,
+			})
+			if query_response.status_code != 200:
+				raise APIQueryError(f"Error ({query_response.reason}):\n{query_response.text}")
+			page = query_response.json()
+			yield page
+			if page_size <= 0 or len(page) < page_size:
+				return
+			offset += len(page)
+
+	def iterate_available_datasets(self) -> Iterator[str]:
+		# NOTE: Only the subtrees of the configured shares are requested and only their ids are returned,
+		#   so unrelated pools do not have to be gathered by the middleware
+		for page in self.iterate_query_pages("/pool/dataset", get_dataset_prefix_query_filters(g.config.shares), {
+			"select": ["id"],
+			"extra": {
+				"flat": True,
+				"retrieve_children": True,
+				"properties": [],
+			},
+		}):
+			yield from (dataset_info["id"] for dataset_info in page)
 
-	@spinner("Retrieving currently active NFS shares")
-	def get_shares_query_response(self):
-		return self.perform_nfs_request(get)
+	def iterate_shares(self, query_filters: list | None = None) -> Iterator[NFSShare]:
+		for page in self.iterate_query_pages("/sharing/nfs", query_filters):
+			yield from NFSShare.list_from_json_array(page)
+
+	def iterate_share_ids(self) -> Iterator[int]:
+		for page in self.iterate_query_pages("/sharing/nfs", query_options={ "select": ["id"] }):
+			yield from (share_info["id"] for share_info in page)
 	
-	def create_share(self, share: NFSShare) -> bool:
-		return self.perform_nfs_request(post, body=share.as_create_dict())
+	def create_share(self, share: NFSShare) -> Response:
+		return self.perform_nfs_request("POST", body=share.as_create_dict())
+
+	def delete_share(self, share: NFSShare) -> Response:
+		return self.perform_nfs_request("DELETE", f"id/{share.id}")
 
-	def delete_share(self, share: NFSShare) -> bool:
-		return self.perform_nfs_request(delete, f"id/{share.id}")
+	def update_share(self, share: NFSShare) -> Response:
+		return self.perform_nfs_request("PUT", f"id/{share.id}", share.as_create_dict())
+
+	def perform_share_operation(self, operation: ShareOperation, share: NFSShare) -> Response:
+		match operation:
+			case ShareOperation.CREATE:
+				return self.create_share(share)
+			case ShareOperation.UPDATE:
+				return self.update_share(share)
+			case ShareOperation.DELETE:
+				return self.delete_share(share)
+
+	# NOTE: Returns a response containing the id of the job that calls the operation for each share
+	def submit_bulk_share_operation_job(self, operation: ShareOperation, shares: list[NFSShare]) -> Response:
+		return self.perform_request("POST", "/core/bulk", json_body={
+			"method": operation.bulk_method,
+			"params": [operation.get_bulk_params(share) for share in shares],
+			"description": f"truenas-recursive-nfs-share: {operation.value} {len(shares)} shares",
+		})
 
-	def update_share(self, share: NFSShare) -> bool:
-		return self.perform_nfs_request(put, f"id/{share.id}", share.as_create_dict())
\ No newline at end of file
+	def get_jobs_query_response(self, job_ids: list[int]) -> Response:
+		return self.perform_request("GET", "/core/get_jobs", json_body={
+			"query-filters": [["id", "in", job_ids]],
+			"query-options": {
+				"select": ["id", "state", "result", "error"],
+			},
+		})
\ No newline at end of file
@@ -0,0 +1,168 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from time import sleep
+from typing import Callable
+
+import helpers.global_fields as g
+
+from data_classes.nfs_share import NFSShare
+from data_classes.share_operation import ShareOperation
+from data_classes.share_operation_result import ShareOperationResult
+from helpers.console import Fore
+from helpers.constants import BULK_JOB_FINISHED_STATES, BULK_JOB_MAX_MISSING_POLLS, BULK_JOB_POLL_INITIAL_INTERVAL_SECONDS, BULK_JOB_POLL_MAX_INTERVAL_SECONDS, DEFAULT_CONCURRENCY
+from helpers.spinner import spinner_generator
+
+def get_concurrency() -> int:
+    if g.args.concurrency is not None:
+        concurrency = g.args.concurrency
+    else:
+        concurrency = g.config.truenas.api.get("concurrency", DEFAULT_CONCURRENCY)
+    if concurrency < 1:
+        raise Exception(f"The concurrency must be at least 1, but {concurrency} was configured")
+    return concurrency
+
+# NOTE: A bulk size of 0 disables batching through core.bulk
+def get_bulk_size() -> int:
+    if g.args.bulk_size is not None:
+        bulk_size = g.args.bulk_size
+    else:
+        bulk_size = g.config.truenas.api.get("bulk_size", 0)
+    if bulk_size < 0:
+        raise Exception(f"The bulk size must not be negative, but {bulk_size} was configured")
+    return bulk_size
+
+def perform_share_operation(operation: ShareOperation, share: NFSShare) -> ShareOperationResult:
+    try:
+        response = g.api_manager.perform_share_operation(operation, share)
+        if response.status_code != 200:
+            return ShareOperationResult(share, error=f"Error ({response.reason}): {response.text}")
+        return ShareOperationResult(share, response.json())
+    except Exception as ex:
+        return ShareOperationResult(share, error=f"{type(ex).__name__}: {ex}")
+
+def perform_share_operations_individually(operation: ShareOperation, shares: list[NFSShare], handle_result: Callable[[ShareOperationResult], None]) -> None:
+    with ThreadPoolExecutor(max_workers=get_concurrency()) as executor:
+        # NOTE: Each operation runs in a copy of the context, so that it uses the API of the current target
+        futures = [executor.submit(copy_context().run, perform_share_operation, operation, share) for share in shares]
+        for future in as_completed(futures):
+            handle_result(future.result())
+
+# NOTE: Returns (int, str): the id of the submitted job, or an error, if the job could not be submitted
+def submit_bulk_share_operation_job(operation: ShareOperation, batch: list[NFSShare]) -> tuple[int | None, str | None]:
+    try:
+        submission_response = g.api_manager.submit_bulk_share_operation_job(operation, batch)
+        if submission_response.status_code != 200:
+            return None, f"Error submitting bulk job ({submission_response.reason}): {submission_response.text}"
+        return submission_response.json(), None
+    except Exception as ex:
+        return None, f"{type(ex).__name__}: {ex}"
+
+def get_bulk_job_results(job: dict, batch: list[NFSShare]) -> list[ShareOperationResult]:
+    if job["state"] != "SUCCESS":
+        return [ShareOperationResult(share, error=f"Bulk job {job['id']} {job['state'].lower()}: {job.get('error')}") for share in batch]
+    # NOTE: core.bulk returns one {"result", "error"} item per call, in the order of the submitted parameters
+    item_results = job.get("result") or []
+    if len(item_results) != len(batch):
+        return [ShareOperationResult(share, error=f"Bulk job {job['id']} returned {len(item_results)} results for {len(batch)} shares") for share in batch]
+    return [
+        ShareOperationResult(share, error=f"Error: {item_result['error']}") if item_result.get("error")
+            else ShareOperationResult(share, item_result.get("result"))
+        for share, item_result in zip(batch, item_results)
+    ]
+
+# NOTE: Up to get_concurrency() jobs are pending at the same time. Their states are polled together with a single request,
+#   with the interval doubling while no job finishes
+def perform_share_operations_in_bulk(operation: ShareOperation, shares: list[NFSShare], bulk_size: int, handle_result: Callable[[ShareOperationResult], None]) -> None:
+    remaining_batches = deque(shares[batch_start:batch_start + bulk_size] for batch_start in range(0, len(shares), bulk_size))
+    maximum_number_of_pending_jobs = get_concurrency()
+    pending_batches: dict[int, list[NFSShare]] = {}
+    missing_polls: dict[int, int] = {}
+    poll_interval = BULK_JOB_POLL_INITIAL_INTERVAL_SECONDS
+
+    while remaining_batches or pending_batches:
+        while remaining_batches and len(pending_batches) < maximum_number_of_pending_jobs:
+            batch = remaining_batches.popleft()
+            job_id, submission_error = submit_bulk_share_operation_job(operation, batch)
+            if submission_error is not None:
+                for share in batch:
+                    handle_result(ShareOperationResult(share, error=submission_error))
+                continue
+            pending_batches[job_id] = batch
+        if not pending_batches:
+            continue
+
+        sleep(poll_interval)
+        try:
+            jobs_response = g.api_manager.get_jobs_query_response(list(pending_batches.keys()))
+            polling_error = None if jobs_response.status_code == 200 else f"Error polling bulk jobs ({jobs_response.reason}): {jobs_response.text}"
+            jobs = jobs_response.json() if polling_error is None else None
+        except Exception as ex:
+            polling_error = f"{type(ex).__name__}: {ex}"
+        if polling_error is not None:
+            for batch in pending_batches.values():
+                for share in batch:
+                    handle_result(ShareOperationResult(share, error=f"State of bulk job unknown, {polling_error}"))
+            pending_batches.clear()
+            missing_polls.clear()
+            continue
+
+        any_job_finished = False
+        polled_job_ids = set()
+        for job in jobs:
+            polled_job_ids.add(job["id"])
+            if job["state"] in BULK_JOB_FINISHED_STATES and job["id"] in pending_batches:
+                for result in get_bulk_job_results(job, pending_batches.pop(job["id"])):
+                    handle_result(result)
+                any_job_finished = True
+        # NOTE: A job that is not returned by core.get_jobs, e.g. because the middleware was restarted, would never finish
+        for job_id in list(pending_batches.keys() - polled_job_ids):
+            missing_polls[job_id] = missing_polls.get(job_id, 0) + 1
+            if missing_polls[job_id] < BULK_JOB_MAX_MISSING_POLLS:
+                continue
+            del missing_polls[job_id]
+            for share in pending_batches.pop(job_id):
+                handle_result(ShareOperationResult(share, error=f"Bulk job {job_id} is missing from core.get_jobs, its state is unknown"))
+            any_job_finished = True
+        for job_id in polled_job_ids:
+            missing_polls.pop(job_id, None)
+        poll_interval = BULK_JOB_POLL_INITIAL_INTERVAL_SECONDS if any_job_finished else min(poll_interval * 2, BULK_JOB_POLL_MAX_INTERVAL_SECONDS)
+
+def execute_share_operations(operation: ShareOperation, shares: list[NFSShare], description: str) -> list[ShareOperationResult]:
+    number_of_shares = len(shares)
+    results: list[ShareOperationResult] = []
+    number_of_failures = 0
+
+    def get_spinner_text():
+        return f"{description} ({len(results)}/{number_of_shares} done, {number_of_failures} failed)..."
+    # NOTE: Operations that were not part of the plan, like deleting manually created shares, are journaled once they are confirmed
+    if g.journal is not None:
+        g.journal.record_planned(operation, shares)
+    with spinner_generator(get_spinner_text()) as spinner:
+        def handle_result(result: ShareOperationResult):
+            nonlocal number_of_failures
+            results.append(result)
+            if not result.succeeded:
+                number_of_failures += 1
+            if g.journal is not None:
+                g.journal.record_result(operation, result)
+            spinner.text = get_spinner_text()
+
+        bulk_size = get_bulk_size()
+        if bulk_size > 0:
+            perform_share_operations_in_bulk(operation, shares, bulk_size, handle_result)
+        else:
+            perform_share_operations_individually(operation, shares, handle_result)
+
+        if number_of_failures > 0:
+            spinner.fail(f"{description}: {number_of_failures} of {number_of_shares} failed")
+        else:
+            spinner.succeed(f"{description}: {number_of_shares} succeeded")
+    return results
+
+# NOTE: Returns whether all operations succeeded
+def report_share_operation_results(results: list[ShareOperationResult]) -> bool:
+    failed_results = [result for result in results if not result.succeeded]
+    for failed_result in failed_results:
+        print(f"{Fore.RED}\t- {failed_result.share.path_name}: {failed_result.error}{Fore.RESET}")
+    return len(failed_results) == 0
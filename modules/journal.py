@@ -0,0 +1,102 @@
+import helpers.global_fields as g
+
+from data_classes.nfs_share import NFSShare
+from data_classes.reconciliation_plan import ReconciliationPlan, ShareUpdate
+from data_classes.resume_journal import ResumeJournal
+from data_classes.share_operation import ShareOperation
+from helpers.console import Fore
+from helpers.constants import MOUNT_PREFIX
+from modules.state import discard_state_snapshot, get_config_hash, get_present_shares, get_shares_query_filters
+from modules.zfs import create_recursive_shares, delete_irrelevant_automatically_created_shares, update_present_recursive_shares
+
+def get_journal_file_path() -> str | None:
+    return g.target.get_file_path(g.args.journal_file)
+
+# NOTE: Records all operations of the plan before any of them is applied, so that an interrupted run can be continued with --resume
+def start_journal(plan: ReconciliationPlan) -> None:
+    journal_file_path = get_journal_file_path()
+    if journal_file_path is None:
+        return
+    g.target.journal = ResumeJournal.start(journal_file_path, get_config_hash())
+    g.journal.record_planned(ShareOperation.DELETE, plan.shares_to_delete)
+    g.journal.record_planned(ShareOperation.UPDATE, plan.shares_to_update)
+    g.journal.record_planned(ShareOperation.CREATE, plan.shares_to_create)
+
+# NOTE: Only called after all phases succeeded, as the journal is needed to resume otherwise
+def finish_journal() -> None:
+    if g.journal is not None:
+        g.journal.remove()
+        g.target.journal = None
+
+# NOTE: Returns None, if there is no journal to resume from, so that a regular run is performed instead.
+#   The remaining operations of the journal are checked against the present shares, as the interrupted run might have
+#   applied some of them without recording it. Only the shares of remaining operations are fetched
+def resume_from_journal() -> bool | None:
+    journal_file_path = get_journal_file_path()
+    if journal_file_path is None:
+        raise Exception("--resume requires the --journal-file of the interrupted run")
+    journal = ResumeJournal.load(journal_file_path)
+    if journal is None:
+        print(f"{Fore.CYAN}Note: No usable journal found at '{journal_file_path}', performing a regular run{Fore.RESET}")
+        return None
+    if journal.config_hash != get_config_hash():
+        print(f"{Fore.CYAN}Note: The config was changed since the journal was written, performing a regular run{Fore.RESET}")
+        return None
+    g.target.journal = journal
+
+    with g.metrics.phase("resume"):
+        remaining_operations = journal.get_remaining_operations()
+        print(f"Resuming from journal: {len(journal.completed_operations)} of {len(journal.planned_operations)} operations were completed, {len(remaining_operations)} remain")
+        share_ids = [share_id for _, share_id in remaining_operations if share_id is not None]
+        share_paths = [path for (_, path), _ in remaining_operations]
+        query_filters = get_shares_query_filters(share_ids, share_paths)
+        present_shares = get_present_shares(query_filters) if query_filters else []
+        present_shares_by_id = {share.id: share for share in present_shares}
+        present_shares_by_path = {share.path: share for share in present_shares}
+
+        shares_to_delete: list[NFSShare] = []
+        share_updates: list[ShareUpdate] = []
+        shares_to_create: list[NFSShare] = []
+        for (operation, path), share_id in remaining_operations:
+            present_share = present_shares_by_id.get(share_id)
+            match operation:
+                case ShareOperation.DELETE:
+                    if present_share is not None:
+                        shares_to_delete.append(present_share)
+                    else:
+                        journal.record_completed(operation, NFSShare(path=path), share_id)
+                case ShareOperation.UPDATE:
+                    desired_share = NFSShare.from_config_options(path.removeprefix(MOUNT_PREFIX))
+                    if present_share is None:
+                        shares_to_create.append(desired_share)
+                        continue
+                    desired_share.id = present_share.id
+                    changed_fields = desired_share.get_changed_fields(present_share)
+                    if changed_fields:
+                        share_updates.append(ShareUpdate(present_share, desired_share, changed_fields))
+                    else:
+                        journal.record_completed(operation, desired_share, desired_share.id)
+                case ShareOperation.CREATE:
+                    present_share = present_shares_by_path.get(path)
+                    if present_share is None:
+                        shares_to_create.append(NFSShare.from_config_options(path.removeprefix(MOUNT_PREFIX)))
+                    else:
+                        journal.record_completed(operation, present_share, present_share.id)
+        journal.record_planned(ShareOperation.CREATE, shares_to_create)
+
+    with g.metrics.phase("delete"):
+        deletion_succeeded = delete_irrelevant_automatically_created_shares(shares_to_delete)
+    if not deletion_succeeded:
+        return False
+    with g.metrics.phase("update"):
+        update_succeeded = update_present_recursive_shares(share_updates)
+    with g.metrics.phase("create"):
+        creation_succeeded = create_recursive_shares(shares_to_create)
+    if not creation_succeeded:
+        return False
+
+    # NOTE: The state snapshot does not reflect the interrupted run, so the next run performs a full sync
+    discard_state_snapshot()
+    if update_succeeded:
+        finish_journal()
+    return True
@@ -0,0 +1,156 @@
+from concurrent.futures import Future
+from hashlib import sha256
+from json import dumps
+from os import path, remove
+
+import helpers.global_fields as g
+
+from data_classes.nfs_share import NFSShare
+from data_classes.reconciliation_plan import ReconciliationPlan
+from data_classes.state_snapshot import StateSnapshot
+from helpers.console import Fore
+from helpers.constants import MOUNT_PREFIX
+from helpers.spinner import spinner
+
+def get_state_file_path() -> str | None:
+    return g.target.get_file_path(g.args.state_file)
+
+def get_config_hash() -> str:
+    effective_config = {
+        "shares": g.config.shares,
+        "share_options": g.config.share_options,
+    }
+    return sha256(dumps(effective_config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def load_state_snapshot() -> StateSnapshot | None:
+    # NOTE: In watch mode, the snapshot of the previous cycle is kept in memory
+    if g.target.state_snapshot is not None:
+        return g.target.state_snapshot
+    state_file_path = get_state_file_path()
+    if state_file_path is None or g.args.full_sync:
+        return None
+    snapshot = StateSnapshot.load(state_file_path)
+    if snapshot is None:
+        print(f"{Fore.CYAN}Note: No usable state snapshot found at '{state_file_path}', performing a full sync{Fore.RESET}")
+    return snapshot
+
+# NOTE: Runs in the background while the relevant datasets are discovered, as neither depends on the other.
+#   With a state snapshot, only the ids of the present shares are needed to validate it, otherwise all shares are fetched
+def prefetch_present_shares(snapshot: StateSnapshot | None) -> set[int] | list[NFSShare]:
+    if snapshot is not None:
+        return set(g.api_manager.iterate_share_ids())
+    return list(g.api_manager.iterate_shares())
+
+@spinner("Retrieving currently active NFS shares")
+def wait_for_prefetched_shares(prefetched_shares_future: Future) -> set[int] | list[NFSShare]:
+    return prefetched_shares_future.result()
+
+@spinner("Retrieving currently active NFS shares")
+def get_all_present_shares() -> list[NFSShare]:
+    return list(g.api_manager.iterate_shares())
+
+@spinner("Retrieving NFS shares that might need changes")
+def get_present_shares(query_filters: list) -> list[NFSShare]:
+    return list(g.api_manager.iterate_shares(query_filters))
+
+# NOTE: Filters for the shares with any of the ids or paths. Empty, if there are neither
+def get_shares_query_filters(share_ids: list[int], share_paths: list[str]) -> list:
+    query_filters = []
+    if share_ids:
+        query_filters.append(["id", "in", share_ids])
+    if share_paths:
+        query_filters.append(["path", "in", share_paths])
+    if len(query_filters) > 1:
+        query_filters = [["OR", query_filters]]
+    return query_filters
+
+# NOTE: Returns (StateSnapshot | None, list[NFSShare], list[str]):
+#   1. The state snapshot, if it is still valid
+#   2. Present shares that might need changes, see obtain_shares_changed_since_snapshot
+#   3. Relevant datasets that need to be reconciled
+def obtain_present_shares(snapshot: StateSnapshot | None, prefetched_shares_future: Future, relevant_datasets: list[str]) -> tuple[StateSnapshot | None, list[NFSShare], list[str]]:
+    if snapshot is None:
+        return None, wait_for_prefetched_shares(prefetched_shares_future), relevant_datasets
+
+    # NOTE: Comparing the ids of all present shares detects shares that were created or deleted since the snapshot was taken.
+    #   Shares that were modified in place by someone else are not detected; use --full-sync to reconcile those
+    try:
+        present_share_ids = wait_for_prefetched_shares(prefetched_shares_future)
+    except Exception as ex:
+        print(f"{Fore.YELLOW}Warning: Could not validate the state snapshot ({ex}), performing a full sync{Fore.RESET}")
+        return None, get_all_present_shares(), relevant_datasets
+    if present_share_ids != set(snapshot.share_ids):
+        print(f"{Fore.CYAN}Note: The NFS shares were changed since the state snapshot was taken, performing a full sync{Fore.RESET}")
+        return None, get_all_present_shares(), relevant_datasets
+
+    return snapshot, *obtain_shares_changed_since_snapshot(snapshot, relevant_datasets)
+
+# NOTE: Returns (list[NFSShare], list[str]):
+#   1. Present shares that might need changes: those of removed datasets, of datasets whose options changed and those at the paths of new datasets
+#   2. Relevant datasets that need to be reconciled, because they are new or their options changed
+def obtain_shares_changed_since_snapshot(snapshot: StateSnapshot, relevant_datasets: list[str]) -> tuple[list[NFSShare], list[str]]:
+    current_datasets = set(relevant_datasets)
+    removed_datasets = [dataset for dataset in snapshot.datasets if dataset not in current_datasets]
+    share_ids_to_fetch = [snapshot.shares[dataset][0] for dataset in removed_datasets if dataset in snapshot.shares]
+    share_paths_to_fetch = []
+
+    is_config_changed = snapshot.config_hash != get_config_hash()
+    datasets_to_reconcile = []
+    for dataset in relevant_datasets:
+        snapshot_share = snapshot.shares.get(dataset)
+        if snapshot_share is None:
+            datasets_to_reconcile.append(dataset)
+            share_paths_to_fetch.append(f"{MOUNT_PREFIX}{dataset}")
+        elif is_config_changed and NFSShare.from_config_options(dataset).get_content_hash() != snapshot_share[1]:
+            datasets_to_reconcile.append(dataset)
+            share_ids_to_fetch.append(snapshot_share[0])
+
+    number_of_unchanged_datasets = len(relevant_datasets) - len(datasets_to_reconcile)
+    print(f"Using state snapshot: {number_of_unchanged_datasets} datasets are unchanged, {len(datasets_to_reconcile)} need to be reconciled and {len(removed_datasets)} were removed")
+
+    query_filters = get_shares_query_filters(share_ids_to_fetch, share_paths_to_fetch)
+    if not query_filters:
+        return [], datasets_to_reconcile
+    return get_present_shares(query_filters), datasets_to_reconcile
+
+# NOTE: Must only be called after all phases of the plan were applied successfully
+def save_state_snapshot(previous_snapshot: StateSnapshot | None, present_shares: list[NFSShare], deleted_shares: list[NFSShare], plan: ReconciliationPlan, relevant_datasets: list[str]) -> None:
+    state_file_path = get_state_file_path()
+    if state_file_path is None and not g.args.watch:
+        return
+    if previous_snapshot is None:
+        share_ids = {share.id for share in present_shares}
+        snapshot_shares = {}
+    else:
+        share_ids = set(previous_snapshot.share_ids)
+        snapshot_shares = dict(previous_snapshot.shares)
+
+    for deleted_share in deleted_shares:
+        share_ids.discard(deleted_share.id)
+        snapshot_share = snapshot_shares.get(deleted_share.path_name)
+        if snapshot_share is not None and snapshot_share[0] == deleted_share.id:
+            del snapshot_shares[deleted_share.path_name]
+    for unchanged_share in plan.unchanged_shares:
+        snapshot_shares[unchanged_share.path_name] = [unchanged_share.id, unchanged_share.get_content_hash()]
+    for updated_share in plan.shares_to_update:
+        snapshot_shares[updated_share.path_name] = [updated_share.id, updated_share.get_content_hash()]
+    for created_share in plan.shares_to_create:
+        share_ids.add(created_share.id)
+        snapshot_shares[created_share.path_name] = [created_share.id, created_share.get_content_hash()]
+
+    snapshot = StateSnapshot(
+        config_hash=get_config_hash(),
+        datasets=list(relevant_datasets),
+        share_ids=sorted(share_ids),
+        shares=snapshot_shares,
+    )
+    if g.args.watch:
+        g.target.state_snapshot = snapshot
+    if state_file_path is not None:
+        snapshot.save(state_file_path)
+
+def discard_state_snapshot() -> None:
+    g.target.state_snapshot = None
+    state_file_path = get_state_file_path()
+    if state_file_path is not None and path.exists(state_file_path):
+        remove(state_file_path)
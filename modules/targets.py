@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from munch import Munch, munchify
+from time import perf_counter
+from typing import Callable
+
+import helpers.global_fields as g
+
+from data_classes.target_context import TargetContext
+from helpers.console import Fore, prefixed_output_lines, set_headless
+
+# NOTE: Values of the override take precedence; nested dicts are merged, all other values (e.g. lists of shares) are replaced
+def merge_config_dicts(base: dict, override: dict) -> dict:
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config_dicts(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def get_target_name(target_config: dict) -> str:
+    if target_config.get("name"):
+        return target_config["name"]
+    host = target_config["truenas"]["api"]["host"]
+    return host.split("://", 1)[-1].rstrip("/")
+
+# NOTE: Each entry of 'targets' in the config is a TrueNAS host with its own truenas, shares and share_options sections.
+#   Sections that a target does not specify are inherited from the top level of the config
+def create_target_contexts(args, config: Munch) -> list[TargetContext]:
+    target_configs = config.get("targets")
+    if not target_configs:
+        return [TargetContext(get_target_name(config), args, config)]
+
+    shared_config = {key: value for key, value in config.items() if key != "targets"}
+    targets = []
+    for target_config in target_configs:
+        effective_config = merge_config_dicts(shared_config, target_config)
+        target_name = get_target_name(effective_config)
+        effective_config.pop("name", None)
+        targets.append(TargetContext(target_name, args, munchify(effective_config), is_only_target=len(target_configs) == 1))
+
+    target_names = [target.name for target in targets]
+    duplicate_target_names = {target_name for target_name in target_names if target_names.count(target_name) > 1}
+    if duplicate_target_names:
+        raise Exception(f"The names of targets must be unique, but {', '.join(sorted(duplicate_target_names))} occur multiple times")
+    return targets
+
+def run_target(target: TargetContext, reconcile: Callable[[], bool]) -> bool:
+    g.activate_target(target)
+    target.succeeded = None
+    start_time = perf_counter()
+    try:
+        target.succeeded = reconcile()
+    finally:
+        target.duration_seconds = perf_counter() - start_time
+        if target.succeeded is None:
+            target.succeeded = False
+    return target.succeeded
+
+def run_target_reporting_errors(target: TargetContext, reconcile: Callable[[], bool]) -> bool:
+    try:
+        return run_target(target, reconcile)
+    except Exception as ex:
+        print(f"{Fore.RED}Error: {type(ex).__name__}: {ex}{Fore.RESET}")
+        return False
+
+def print_targets_summary(targets: list[TargetContext]) -> None:
+    print(f"\n{'target':<32}{'result':>8}{'wall [s]':>12}{'requests':>10}{'errors':>8}")
+    for target in targets:
+        request_summaries = target.metrics.get_request_summaries()
+        number_of_requests = sum(request_summary.count for request_summary in request_summaries)
+        number_of_errors = sum(request_summary.errors for request_summary in request_summaries)
+        print(f"{target.name:<32}{'ok' if target.succeeded else 'failed':>8}{target.duration_seconds:>12.3f}{number_of_requests:>10}{number_of_errors:>8}")
+
+# NOTE: Multiple targets are reconciled in parallel threads, each in its own context. Since prompts of parallel targets
+#   cannot be answered sensibly, headless mode is enforced and output lines are prefixed with the name of their target
+def run_targets(targets: list[TargetContext], reconcile: Callable[[], bool]) -> bool:
+    if len(targets) == 1:
+        return run_target(targets[0], reconcile)
+
+    args = targets[0].args
+    if args.stdin or args.datasets_file is not None:
+        raise Exception("Datasets can only be read from STDIN or a datasets file for a single target, as they differ between hosts")
+    if not args.headless:
+        print(f"{Fore.CYAN}Note: Reconciling {len(targets)} targets in parallel, prompts are answered by --yes and --assume-no-deletes only{Fore.RESET}")
+        set_headless(True)
+
+    with prefixed_output_lines(lambda: f"[{g.target.name}] " if g.target is not None else ""), ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        futures = [executor.submit(copy_context().run, run_target_reporting_errors, target, reconcile) for target in targets]
+        for future in futures:
+            future.result()
+
+    print_targets_summary(targets)
+    return all(target.succeeded for target in targets)
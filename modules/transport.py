@@ -0,0 +1,36 @@
+from munch import Munch
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3 import disable_warnings
+from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
+
+from helpers.constants import DEFAULT_REQUEST_RETRIES, DEFAULT_RETRY_BACKOFF_FACTOR, RETRY_STATUS_CODES
+
+# NOTE: Any object providing request(method, url, **kwargs) -> Response, like requests.Session, can be used as a transport.
+#   This allows the APIManager to be run against a stub server or an entirely different backend.
+def create_http_session(api_config: Munch, pool_size: int) -> Session:
+	retry_policy = Retry(
+		total=api_config.get("retries", DEFAULT_REQUEST_RETRIES),
+		backoff_factor=api_config.get("retry_backoff_factor", DEFAULT_RETRY_BACKOFF_FACTOR),
+		status_forcelist=RETRY_STATUS_CODES,
+		# NOTE: Non-idempotent requests (POST) are only retried if the connection could not be established,
+		#   since retrying after a server error might otherwise create shares twice
+		respect_retry_after_header=True,
+		raise_on_status=False,
+	)
+	adapter = HTTPAdapter(
+		pool_connections=1,
+		pool_maxsize=pool_size,
+		max_retries=retry_policy,
+	)
+
+	session = Session()
+	session.mount("http://", adapter)
+	session.mount("https://", adapter)
+
+	verify_tls = api_config.get("verify_tls", True)
+	session.verify = verify_tls
+	if verify_tls is False:
+		disable_warnings(InsecureRequestWarning)
+	return session
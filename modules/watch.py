@@ -0,0 +1,148 @@
+from os import path
+from sys import stdin
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+from typing import Callable
+import signal
+
+from data_classes.target_context import TargetContext
+from helpers.console import Fore, set_headless
+from helpers.constants import WATCH_MAX_DEBOUNCE_DELAY_SECONDS, WATCH_TRIGGER_FILE_POLL_INTERVAL_SECONDS
+from helpers.metrics import MetricsCollector
+from modules.targets import run_targets
+
+class WatchTriggers:
+    def __init__(self):
+        self.event = Event()
+        self.lock = Lock()
+        self.reasons: list[str] = []
+        self.stop_reason: str | None = None
+
+    def trigger(self, reason: str) -> None:
+        with self.lock:
+            if reason not in self.reasons:
+                self.reasons.append(reason)
+        self.event.set()
+
+    def stop(self, reason: str) -> None:
+        self.stop_reason = reason
+        self.event.set()
+
+    @property
+    def is_stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    # NOTE: Returns the reasons of all triggers since the last call, or an empty list if the timeout elapsed first
+    def wait(self, timeout_seconds: float | None) -> list[str]:
+        self.event.wait(timeout_seconds)
+        with self.lock:
+            self.event.clear()
+            reasons, self.reasons = self.reasons, []
+        return reasons
+
+    # NOTE: Waits until there was no trigger for debounce_seconds, but at most WATCH_MAX_DEBOUNCE_DELAY_SECONDS,
+    #   so that a burst of changes (e.g. many datasets being created) is handled by a single cycle
+    def debounce(self, debounce_seconds: float) -> list[str]:
+        reasons = []
+        deadline = monotonic() + WATCH_MAX_DEBOUNCE_DELAY_SECONDS
+        while not self.is_stopped and monotonic() < deadline:
+            new_reasons = self.wait(min(debounce_seconds, max(deadline - monotonic(), 0)))
+            if not new_reasons:
+                break
+            reasons += [reason for reason in new_reasons if reason not in reasons]
+        return reasons
+
+def get_modification_time(file_path: str) -> float | None:
+    try:
+        return path.getmtime(file_path)
+    except OSError:
+        return None
+
+def watch_trigger_file(triggers: WatchTriggers, file_path: str) -> None:
+    last_modification_time = get_modification_time(file_path)
+    while not triggers.is_stopped:
+        sleep(WATCH_TRIGGER_FILE_POLL_INTERVAL_SECONDS)
+        modification_time = get_modification_time(file_path)
+        if modification_time != last_modification_time:
+            last_modification_time = modification_time
+            triggers.trigger(f"{file_path} was modified")
+
+# NOTE: Each output of zfs list on STDIN ends with an empty line, e.g. of
+#   while true; do zfs list -H -o name; echo; sleep 10; done | python3 recursive-nfs.py --stdin --datasets-columns name --watch --yes
+def watch_stdin(triggers: WatchTriggers, target: TargetContext) -> None:
+    zfs_list_output_lines = []
+    for line in stdin:
+        if line.strip():
+            zfs_list_output_lines.append(line)
+            continue
+        if zfs_list_output_lines:
+            target.zfs_list_output_lines, zfs_list_output_lines = zfs_list_output_lines, []
+            triggers.trigger("datasets were received on STDIN")
+    if zfs_list_output_lines:
+        target.zfs_list_output_lines = zfs_list_output_lines
+        triggers.trigger("datasets were received on STDIN")
+    triggers.stop("STDIN was closed")
+
+def install_signal_handlers(triggers: WatchTriggers) -> None:
+    # NOTE: SIGUSR1 is not available on Windows
+    for signal_name in ("SIGHUP", "SIGUSR1"):
+        if hasattr(signal, signal_name):
+            signal.signal(getattr(signal, signal_name), lambda signal_number, _: triggers.trigger(f"{signal.Signals(signal_number).name} was received"))
+    signal.signal(signal.SIGTERM, lambda *_: triggers.stop("SIGTERM was received"))
+
+# NOTE: Reconciles the targets in cycles until stopped. Their connections and state snapshots are kept between cycles,
+#   so that a cycle that nothing changed for only queries the dataset names and share ids.
+#   Returns whether the last cycle succeeded
+def watch_targets(targets: list[TargetContext], reconcile: Callable[[], bool], export_cycle_metrics: Callable[[], None]) -> bool:
+    args = targets[0].args
+    # NOTE: Nobody is there to answer prompts of a daemon, and STDIN might be used for datasets
+    args.headless = True
+    set_headless(True)
+    if not args.yes:
+        print(f"{Fore.YELLOW}Warning: Watching without --yes, so shares are never created or updated{Fore.RESET}")
+
+    triggers = WatchTriggers()
+    install_signal_handlers(triggers)
+    if args.watch_trigger_file is not None:
+        Thread(target=watch_trigger_file, args=(triggers, args.watch_trigger_file), daemon=True).start()
+    reasons = ["watching started"]
+    if args.stdin:
+        Thread(target=watch_stdin, args=(triggers, targets[0]), daemon=True).start()
+        reasons = triggers.wait(None)
+        if targets[0].zfs_list_output_lines is None:
+            print(f"{Fore.CYAN}Note: No datasets were received on STDIN, stopping to watch{Fore.RESET}")
+            return False
+
+    cycle_number = 0
+    succeeded = False
+    try:
+        while True:
+            cycle_number += 1
+            print(f"\nCycle {cycle_number}: {', '.join(reasons or ['the watch interval elapsed'])}")
+            for target in targets:
+                target.metrics = MetricsCollector()
+            try:
+                succeeded = run_targets(targets, reconcile)
+            except Exception as ex:
+                print(f"{Fore.RED}Error: {type(ex).__name__}: {ex}{Fore.RESET}")
+                succeeded = False
+            for target in targets:
+                if not target.succeeded:
+                    target.discard_warm_state()
+            export_cycle_metrics()
+            # NOTE: Only the first cycle continues an interrupted run or ignores a state snapshot
+            args.resume = False
+            args.full_sync = False
+
+            if triggers.is_stopped:
+                break
+            reasons = triggers.wait(args.watch_interval)
+            if reasons:
+                reasons += [reason for reason in triggers.debounce(args.watch_debounce) if reason not in reasons]
+            # NOTE: Changes that were triggered before stopping, like the last output of zfs list on STDIN, are still handled
+            elif triggers.is_stopped:
+                break
+    except KeyboardInterrupt:
+        triggers.stop("interrupted")
+    print(f"{Fore.CYAN}Note: Stopped watching, as {triggers.stop_reason}{Fore.RESET}")
+    return succeeded
@@ -0,0 +1,148 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from itertools import count
+from json import dumps, loads
+from munch import Munch
+from re import fullmatch
+from ssl import CERT_NONE
+from threading import Lock, Thread
+from websocket import WebSocket, WebSocketException, create_connection
+
+from helpers.constants import DEFAULT_CONNECT_TIMEOUT_SECONDS, DEFAULT_WEBSOCKET_PATH
+
+# NOTE: Mimics the parts of requests.Response that are used by this tool
+class RPCResponse:
+	def __init__(self, message: dict):
+		self.message = message
+		error = message.get("error")
+		if error is None:
+			self.status_code = 200
+			self.reason = "OK"
+			self.result = message.get("result")
+			self.text = dumps(self.result)
+		else:
+			self.status_code = 500 if error.get("code") == -32603 else 422
+			self.reason = error.get("message", "JSON-RPC error")
+			self.result = None
+			self.text = dumps(error.get("data") or error)
+		self.content = self.text.encode()
+
+	def json(self):
+		return self.result
+
+def get_query_params(json_body: dict | None) -> list:
+	json_body = json_body or {}
+	return [json_body.get("query-filters") or [], json_body.get("query-options") or {}]
+
+# NOTE: Maps (HTTP method, REST endpoint, JSON body) of the requests sent by the APIManager to (middleware method, params)
+def get_rpc_call(request_method: str, endpoint: str, json_body: dict | None) -> tuple[str, list]:
+	endpoint = endpoint.rstrip("/")
+	match request_method, endpoint:
+		case "GET", "/api_key":
+			return "api_key.query", get_query_params(json_body)
+		case "GET", "/pool/dataset":
+			return "pool.dataset.query", get_query_params(json_body)
+		case "GET", "/sharing/nfs":
+			return "sharing.nfs.query", get_query_params(json_body)
+		case "GET", "/core/get_jobs":
+			return "core.get_jobs", get_query_params(json_body)
+		case "POST", "/sharing/nfs":
+			return "sharing.nfs.create", [json_body]
+		case "POST", "/core/bulk":
+			return "core.bulk", [json_body["method"], json_body["params"], json_body.get("description")]
+	share_id_match = fullmatch(r"/sharing/nfs/id/(\d+)", endpoint)
+	if share_id_match is not None:
+		share_id = int(share_id_match.group(1))
+		if request_method == "PUT":
+			return "sharing.nfs.update", [share_id, json_body]
+		if request_method == "DELETE":
+			return "sharing.nfs.delete", [share_id]
+	raise Exception(f"{request_method} {endpoint} is not supported by the WebSocket transport")
+
+# NOTE: Transport for the APIManager that speaks JSON-RPC 2.0 over a single WebSocket connection to the middleware.
+#   Calls from multiple threads are sent as soon as they are issued and their responses are correlated by id,
+#   so that many calls can be in flight at the same time
+class WebSocketTransport:
+	def __init__(self, api_config: Munch):
+		self.uri_prefix = f"{api_config.host}{api_config.path}"
+		websocket_uri = f"{api_config.host}{api_config.get('websocket_path', DEFAULT_WEBSOCKET_PATH)}"
+		websocket_uri = websocket_uri.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+
+		verify_tls = api_config.get("verify_tls", True)
+		if verify_tls is False:
+			ssl_options = { "cert_reqs": CERT_NONE, "check_hostname": False }
+		elif isinstance(verify_tls, str):
+			ssl_options = { "ca_certs": verify_tls }
+		else:
+			ssl_options = {}
+
+		self.connection: WebSocket = create_connection(
+			websocket_uri,
+			timeout=api_config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT_SECONDS),
+			sslopt=ssl_options,
+		)
+		# NOTE: The receiver blocks on the socket, sending is guarded by a lock instead of a timeout
+		self.connection.settimeout(None)
+		self.send_lock = Lock()
+		self.pending_calls_lock = Lock()
+		self.pending_calls: dict[int, Future] = {}
+		self.call_ids = count(1)
+		self.connection_error: Exception | None = None
+		Thread(target=self.receive_messages, daemon=True).start()
+
+		login_response = self.call("auth.login_with_api_key", [api_config.key])
+		if login_response.status_code != 200 or login_response.result is not True:
+			self.close()
+			raise Exception(f"Authentication with the API key over the WebSocket failed: {login_response.text}")
+
+	def receive_messages(self) -> None:
+		try:
+			while True:
+				message = loads(self.connection.recv())
+				with self.pending_calls_lock:
+					pending_call = self.pending_calls.pop(message.get("id"), None)
+				if pending_call is not None:
+					pending_call.set_result(RPCResponse(message))
+		except (WebSocketException, OSError, ValueError) as ex:
+			with self.pending_calls_lock:
+				self.connection_error = ex
+				pending_calls = list(self.pending_calls.values())
+				self.pending_calls.clear()
+			for pending_call in pending_calls:
+				pending_call.set_exception(ConnectionError(f"The WebSocket connection was closed: {ex}"))
+
+	def call(self, rpc_method: str, params: list, timeout: float | None = None) -> RPCResponse:
+		call_id = next(self.call_ids)
+		pending_call = Future()
+		with self.pending_calls_lock:
+			if self.connection_error is not None:
+				raise ConnectionError(f"The WebSocket connection was closed: {self.connection_error}")
+			self.pending_calls[call_id] = pending_call
+		request_message = dumps({
+			"jsonrpc": "2.0",
+			"id": call_id,
+			"method": rpc_method,
+			"params": params,
+		})
+		try:
+			with self.send_lock:
+				self.connection.send(request_message)
+		except (WebSocketException, OSError) as ex:
+			with self.pending_calls_lock:
+				self.pending_calls.pop(call_id, None)
+			raise ConnectionError(f"The WebSocket connection was closed: {ex}") from ex
+		try:
+			return pending_call.result(timeout)
+		except FutureTimeoutError:
+			with self.pending_calls_lock:
+				self.pending_calls.pop(call_id, None)
+			raise TimeoutError(f"No response to {rpc_method} was received within {timeout} seconds")
+
+	# NOTE: Same signature as requests.Session.request for the arguments used by the APIManager
+	def request(self, request_method: str, uri: str, headers: dict | None = None, timeout: tuple | float | None = None, json: dict | None = None, params: dict | None = None) -> RPCResponse:
+		endpoint = uri[len(self.uri_prefix):] if uri.startswith(self.uri_prefix) else uri
+		rpc_method, rpc_params = get_rpc_call(request_method, endpoint, json)
+		read_timeout = timeout[-1] if isinstance(timeout, tuple) else timeout
+		return self.call(rpc_method, rpc_params, read_timeout)
+
+	def close(self) -> None:
+		self.connection.close()
@@ -1,166 +1,160 @@
-from colorama import Fore
-from halo import Halo
+from requests import RequestException
 from sys import stdin
+from typing import Iterable, Iterator
 
 import helpers.global_fields as g
 
 from data_classes.nfs_share import NFSShare
-from helpers.cli_utility import is_input_prompt_positive
-from helpers.spinner import spinner, spinner_generator
-
-def obtain_zfs_list_output() -> list[str]:
-    if g.args.datasets_file is not None:
-        with open(g.args.datasets_file, "r") as dataset_file_handle, Halo(f"Reading dataset list from '{g.args.datasets_file}'"):
-            return dataset_file_handle.readlines()
+from data_classes.reconciliation_index import DatasetPrefixTrie
+from data_classes.reconciliation_plan import ShareUpdate
+from data_classes.share_operation import ShareOperation
+from helpers.cli_utility import confirm
+from helpers.console import Fore
+from helpers.spinner import spinner
+from modules.api import APIQueryError
+from modules.executor import execute_share_operations, report_share_operation_results
+
+def is_zfs_list_output_provided() -> bool:
+    return g.args.datasets_file is not None or g.args.stdin
+
+def read_zfs_list_output_lines() -> Iterator[str]:
+    # NOTE: In watch mode, STDIN is read continuously and each cycle uses the output of zfs list that was received last
+    if g.target.zfs_list_output_lines is not None:
+        yield from g.target.zfs_list_output_lines
+    elif g.args.datasets_file is not None:
+        with open(g.args.datasets_file, "r") as dataset_file_handle:
+            yield from dataset_file_handle
     elif g.args.stdin:
         print("Attempting to read from STDIN...\nPass in a file, or enter content manually and confirm with Ctrl+D (Ctrl+Z, then Enter on Windows)")
-        return stdin.readlines()
+        yield from stdin
+
+# NOTE: 'zfs list -H' separates columns by tabs, otherwise they are aligned with spaces (column_separator None).
+#   Dataset names containing spaces are therefore not supported in the aligned format with multiple columns.
+#   A line with an unexpected number of values is rejected, as a misread dataset would have its share deleted
+def split_zfs_list_line(line: str, number_of_columns: int, column_separator: str | None) -> list[str]:
+    if number_of_columns == 1:
+        return [line]
+    values = line.split(column_separator)
+    if len(values) != number_of_columns:
+        raise Exception(f"Expected {number_of_columns} columns, but found {len(values)} in the line '{line}' of the list of datasets. Terminating for safety.")
+    return values
+
+# NOTE: Yields the names of all filesystem datasets in the output of 'zfs list -o name[,...]', one line at a time.
+#   Snapshots, bookmarks and (if a type column is present) volumes are skipped
+def parse_zfs_list_output(zfs_list_output_lines: Iterable[str]) -> Iterator[str]:
+    stripped_lines = (line.strip() for line in zfs_list_output_lines)
+    non_empty_lines = (line for line in stripped_lines if len(line) > 0)
+
+    if g.args.datasets_columns is not None:
+        # Output of 'zfs list -H -o ...' does not contain a header
+        columns = [column.strip().lower() for column in g.args.datasets_columns.split(",")]
+        column_separator = "\t"
     else:
-        return None
-
-@spinner("Extracting list of datasets")
-def obtain_list_of_all_datasets(zfs_list_output) -> list[str]:
-    filtered_list_output = [line.strip() for line in zfs_list_output if len(line.strip()) > 0]
-    
-    if not isinstance(filtered_list_output, list) or len(filtered_list_output) < 1:
-        raise Exception("No list of datasets was received (via STDIN or the datasets-file).\nPlease see the quick guide for reference on how to use this tool")
-    
-    expected_list_header = filtered_list_output[0]
-    if expected_list_header != "NAME":
-        raise Exception("Expected list header 'NAME' from 'zfs list -o name' invocation. Terminating for safety.")
-    
-    list_without_header = filtered_list_output[1:]
-    print(f"Found {len(list_without_header)} datasets in total")
-    return list_without_header
-
-def get_list_of_relevant_datasets_for_dataset_list(dataset_list: list[str]) -> list[str]:
-    def is_dataset_relevant(dataset: str):
-        return any(dataset.startswith(requested_recursive_share) for requested_recursive_share in g.config.shares)
-    relevant_datasets = [dataset for dataset in dataset_list if is_dataset_relevant(dataset)]
-    print(f"{len(relevant_datasets)} of {len(dataset_list)} datasets require shares with the current config:")
-    for dataset in relevant_datasets:
-        print(f"\t- {dataset}")
+        expected_list_header = next(non_empty_lines, None)
+        if expected_list_header is None:
+            raise Exception("No list of datasets was received (via STDIN or the datasets-file).\nPlease see the quick guide for reference on how to use this tool")
+        column_separator = "\t" if "\t" in expected_list_header else None
+        columns = [column.lower() for column in expected_list_header.split(column_separator)]
+        if "name" not in columns:
+            raise Exception("Expected list header containing 'NAME' from 'zfs list -o name' invocation (use --datasets-columns for output of 'zfs list -H'). Terminating for safety.")
+
+    if "name" not in columns:
+        raise Exception(f"The dataset columns {columns} do not contain 'name'")
+    name_column_index = columns.index("name")
+    type_column_index = columns.index("type") if "type" in columns else None
+
+    for line in non_empty_lines:
+        values = split_zfs_list_line(line, len(columns), column_separator)
+        dataset = values[name_column_index]
+        if "@" in dataset or "#" in dataset:
+            continue
+        if type_column_index is not None and values[type_column_index] != "filesystem":
+            continue
+        yield dataset
+
+def get_list_of_relevant_datasets_for_datasets(datasets: Iterable[str]) -> list[str]:
+    requested_recursive_shares_trie = DatasetPrefixTrie(g.config.shares)
+    number_of_datasets = 0
+    relevant_datasets = []
+    for dataset in datasets:
+        number_of_datasets += 1
+        if requested_recursive_shares_trie.matches(dataset):
+            relevant_datasets.append(dataset)
+    print(f"{len(relevant_datasets)} of {number_of_datasets} datasets require shares with the current config")
     return relevant_datasets
 
-def get_list_of_relevant_datasets_for_list_output(zfs_list_output: list[str]) -> list[str]:
-    all_datasets = obtain_list_of_all_datasets(zfs_list_output)
-    return get_list_of_relevant_datasets_for_dataset_list(all_datasets)
+@spinner("Extracting list of relevant datasets")
+def get_list_of_relevant_datasets_for_list_output(zfs_list_output_lines: Iterable[str]) -> list[str]:
+    return get_list_of_relevant_datasets_for_datasets(parse_zfs_list_output(zfs_list_output_lines))
+
+@spinner("Retrieving available datasets")
+def get_list_of_relevant_datasets_for_api() -> list[str]:
+    return get_list_of_relevant_datasets_for_datasets(g.api_manager.iterate_available_datasets())
 
 def obtain_list_of_relevant_datasets() -> list[str]:
-    zfs_list_output = obtain_zfs_list_output()
-    if zfs_list_output is None:
-        # No data retrieved from datasets file or STDIN. Falling back to API request
-        datasets_query_response = g.api_manager.get_available_datasets_query_response()
-        if datasets_query_response.status_code != 200:
-            print(f"{Fore.RED}Could not gather available datasets from any applicable source. Please refer to the help page.{Fore.RED}")
+    if not is_zfs_list_output_provided():
+        # No datasets file or STDIN specified. Falling back to API request
+        try:
+            relevant_datasets = get_list_of_relevant_datasets_for_api()
+        except (APIQueryError, RequestException, OSError, ValueError) as ex:
+            print(f"{Fore.RED}Could not gather available datasets from any applicable source ({type(ex).__name__}: {ex}). Please refer to the help page.{Fore.RESET}")
             return None
-        datasets_response_json = datasets_query_response.json()
-        all_datasets = [dataset_info["id"] for dataset_info in datasets_response_json]
-        all_datasets.sort()
-        return get_list_of_relevant_datasets_for_dataset_list(all_datasets)
+        relevant_datasets.sort()
+        return relevant_datasets
     else:    
-        return get_list_of_relevant_datasets_for_list_output(zfs_list_output)
+        return get_list_of_relevant_datasets_for_list_output(read_zfs_list_output_lines())
 
-def handle_non_automatic_relevant_shares(non_automatic_relevant_shares: list[NFSShare]):
+# NOTE: Returns the list of shares that were deleted
+def handle_non_automatic_relevant_shares(non_automatic_relevant_shares: list[NFSShare]) -> list[NFSShare]:
     number_of_problematic_shares = len(non_automatic_relevant_shares)
     print(f"{Fore.YELLOW}Warning: There are {number_of_problematic_shares} active relevant NFS shares that have not been automatically created:{Fore.RESET}")
     print("\n".join(
         str(share) for share in non_automatic_relevant_shares)
     )
-    delete_non_automatic_shares_response = input("\nDo you want to delete them? y/[n]: ")
-    should_delete_non_automatic_shares = is_input_prompt_positive(delete_non_automatic_shares_response)
+    should_delete_non_automatic_shares = confirm("Do you want to delete them?", default=False, is_manual_share_deletion=True)
 
     if should_delete_non_automatic_shares:
-        with spinner_generator(f"Removing {number_of_problematic_shares} present manual shares"):
-            for non_automatic_share in non_automatic_relevant_shares:
-                g.api_manager.delete_share(non_automatic_share)
-
-# NOTE: Returns (bool, list[NFSShare]):
-#   1. Whether all shares that need to be deleted, were (also True if no shares had to be deleted)            
-#   2. List of all relevant automatically created shares (Note: None is returned in this element, if the action failed)
-def delete_irrelevant_automatically_created_shares(all_shares: list[NFSShare], relevant_datasets: list[str]) -> tuple[bool, list[NFSShare]]:
-    automatically_created_shares = [share for share in all_shares if share.is_automatically_created()]
-    number_of_automatically_created_shares = len(automatically_created_shares)
-    if number_of_automatically_created_shares <= 0:
-        return True, []
-
-    # Filter for relevant shares that should only be updated, instead of deleted
-    irrelevant_automatically_created_shares = [share for share in automatically_created_shares if share.path_name not in relevant_datasets]
-    relevant_automatically_created_shares = [share for share in automatically_created_shares if share not in irrelevant_automatically_created_shares]
-    number_of_shares_to_delete = len(irrelevant_automatically_created_shares)
+        deletion_results = execute_share_operations(ShareOperation.DELETE, non_automatic_relevant_shares, f"Removing {number_of_problematic_shares} present manual shares")
+        report_share_operation_results(deletion_results)
+        return [deletion_result.share for deletion_result in deletion_results if deletion_result.succeeded]
+    return []
 
+# NOTE: Returns whether all shares that need to be deleted, were (also True if no shares had to be deleted or deletions are skipped by policy)
+def delete_irrelevant_automatically_created_shares(irrelevant_automatically_created_shares: list[NFSShare]) -> bool:
+    number_of_shares_to_delete = len(irrelevant_automatically_created_shares)
     if number_of_shares_to_delete <= 0:
-        return True, relevant_automatically_created_shares
+        return True
 
     print(f"{Fore.YELLOW}Warning: The following {number_of_shares_to_delete} automatically created shares are no longer relevant:")
     for automatic_share in irrelevant_automatically_created_shares:
         print(automatic_share)
     print(f"{Fore.YELLOW}Warning: Above automatically created shares ({number_of_shares_to_delete}) will be deleted.\n{Fore.RESET}")
 
-    delete_automatic_shares_response = input("\nDo you want to delete these automatically created shares? y/[n]: ")
-    should_delete_automatic_shares = is_input_prompt_positive(delete_automatic_shares_response)
+    should_delete_automatic_shares = confirm("Do you want to delete these automatically created shares?", default=False, is_deletion=True)
     if not should_delete_automatic_shares:
-        return False, None
+        # NOTE: Deletions skipped by the --assume-no-deletes policy do not prevent the remaining phases
+        return g.args.assume_no_deletes
     
-    remaining_number_of_shares_to_delete = number_of_shares_to_delete
-    def get_spinner_text(share: NFSShare):
-        return f"Removing automatically created shares ({share.path_name}, {remaining_number_of_shares_to_delete} remaining)..."
-    starting_spinner_text = f"Removing automatically created shares ({number_of_shares_to_delete})"
-    with spinner_generator(starting_spinner_text) as spinner:
-        for automatic_share in irrelevant_automatically_created_shares:
-            spinner.start(get_spinner_text(automatic_share))
-            g.api_manager.delete_share(automatic_share)
-            remaining_number_of_shares_to_delete -= 1
-        spinner.succeed(starting_spinner_text)
-
-    return True, relevant_automatically_created_shares
-
-def generate_shares_based_on_config(relevant_datasets: list[str]) -> list[NFSShare]:
-    return [
-        NFSShare.from_config_options(relevant_dataset_path_name)
-        for relevant_dataset_path_name in relevant_datasets
-    ]
-
-def update_present_recursive_shares(relevant_automatically_created_shares: list[NFSShare]) -> bool:
-    already_covered_datasets = [share.path_name for share in relevant_automatically_created_shares]
-    shares_with_new_values = generate_shares_based_on_config(already_covered_datasets)
-    for share in shares_with_new_values:
-        matching_shares_generator = (
-            matching_share for matching_share in relevant_automatically_created_shares
-                if matching_share.path_name == share.path_name
-        )
-        matching_present_share = next(matching_shares_generator, None)
-        if matching_present_share is None:
-            raise Exception("No matching, already present share was found, despite this being expected. This is almost definitely an error by this application. Please report this as a bug and attach the entire log and config.")
-        share.id = matching_present_share.id
-
-    number_of_shares_to_update = len(shares_with_new_values)
-    number_of_remaining_shares = number_of_shares_to_update
+    deletion_results = execute_share_operations(ShareOperation.DELETE, irrelevant_automatically_created_shares, f"Removing {number_of_shares_to_delete} automatically created shares")
+    return report_share_operation_results(deletion_results)
 
+def update_present_recursive_shares(share_updates: list[ShareUpdate]) -> bool:
+    number_of_shares_to_update = len(share_updates)
     if number_of_shares_to_update <= 0:
         return True
 
-    print(f"{Fore.CYAN}Warning: There are {number_of_shares_to_update} still relevant, automatically created shares. This tool will attempt to update them.")
-    update_automatic_shares_response = input("\nDo you want to proceed updating these shares? [y]/n: ")
-    should_update_automatic_shares = (not update_automatic_shares_response) or is_input_prompt_positive(update_automatic_shares_response)
+    print(f"{Fore.CYAN}Warning: There are {number_of_shares_to_update} still relevant, automatically created shares that differ from the config. This tool will attempt to update them:{Fore.RESET}")
+    for share_update in share_updates:
+        print(f"\t~ {share_update.desired_share.path_name}: {', '.join(share_update.changed_fields)}")
+    should_update_automatic_shares = confirm("Do you want to proceed updating these shares?", default=True)
     if not should_update_automatic_shares:
         return False
-    
-    def get_spinner_text(share: NFSShare):
-        return f"Updating share {share.path_name} ({number_of_remaining_shares} remaining)..."
-    with spinner_generator(f"Updating {number_of_shares_to_update} shares...") as spinner:
-        for updated_share in shares_with_new_values:
-            spinner.start(get_spinner_text(updated_share))
-            update_response = g.api_manager.update_share(updated_share)
-            if update_response.status_code != 200:
-                raise Exception(f"Error ({update_response.reason}):\n{update_response.text}")
-            number_of_remaining_shares -= 1
-        spinner.succeed(f"Updated {number_of_shares_to_update} already present shares")
-
-    return True
-
-def create_recursive_shares(relevant_datasets: list[str]) -> bool:
-    shares_to_create = generate_shares_based_on_config(relevant_datasets)
+
+    shares_with_new_values = [share_update.desired_share for share_update in share_updates]
+    update_results = execute_share_operations(ShareOperation.UPDATE, shares_with_new_values, f"Updating {number_of_shares_to_update} already present shares")
+    return report_share_operation_results(update_results)
+
+def create_recursive_shares(shares_to_create: list[NFSShare]) -> bool:
     number_of_shares_to_create = len(shares_to_create)
     if number_of_shares_to_create <= 0:
         print(f"{Fore.CYAN}Note: There are no relevant datasets available that need new shares\n{Fore.RESET}")
@@ -171,22 +165,13 @@ def create_recursive_shares(relevant_datasets: list[str]) -> bool:
         str(share) for share in shares_to_create)
     )
     print(f"{Fore.CYAN}Warning: Attempting to create the above ({number_of_shares_to_create}) NFS shares{Fore.RESET}")
-    create_automatic_shares_response = input("\nDo you want to create them? [y]/n: ")
-    should_create_automatic_shares = (not create_automatic_shares_response) or is_input_prompt_positive(create_automatic_shares_response)
+    should_create_automatic_shares = confirm("Do you want to create them?", default=True)
 
     if not should_create_automatic_shares:
         return False
-    
-    number_of_remaining_shares = number_of_shares_to_create
-    def get_spinner_text(share: NFSShare):
-        return f"Creating share {share.path_name} ({number_of_remaining_shares} remaining)..."
-    with spinner_generator(f"Creating {number_of_shares_to_create} shares...") as spinner:
-        for automatic_share in shares_to_create:
-            spinner.start(get_spinner_text(automatic_share))
-            creation_response = g.api_manager.create_share(automatic_share)
-            if creation_response.status_code != 200:
-                raise Exception(f"Error ({creation_response.reason}):\n{creation_response.text}")
-            number_of_remaining_shares -= 1
-        spinner.succeed(f"Created {number_of_shares_to_create} shares")
-
-    return True
\ No newline at end of file
+
+    creation_results = execute_share_operations(ShareOperation.CREATE, shares_to_create, f"Creating {number_of_shares_to_create} shares")
+    for creation_result in creation_results:
+        if creation_result.succeeded:
+            creation_result.share.id = creation_result.result["id"]
+    return report_share_operation_results(creation_results)
\ No newline at end of file
@@ -1,62 +1,121 @@
-from colorama import Fore
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 
 import helpers.global_fields as g
 
-from data_classes.nfs_share import NFSShare
+from data_classes.reconciliation_index import ReconciliationIndex
+from data_classes.reconciliation_plan import ReconciliationPlan
 from helpers.args import obtain_args
 from helpers.config_loader import obtain_config, obtain_config
+from helpers.console import Fore, set_headless
+from helpers.metrics import export_metrics
 from modules.api import APIManager
+from modules.journal import finish_journal, resume_from_journal, start_journal
+from modules.state import discard_state_snapshot, load_state_snapshot, obtain_present_shares, prefetch_present_shares, save_state_snapshot
+from modules.targets import create_target_contexts, run_targets
+from modules.watch import watch_targets
 from modules.zfs import create_recursive_shares, delete_irrelevant_automatically_created_shares, handle_non_automatic_relevant_shares, obtain_list_of_relevant_datasets, update_present_recursive_shares
 
-def main(_args, _config) -> bool:
-    g.config = _config
-    g.args = _args
+# NOTE: Reconciles the target activated in the current context, see modules/targets.py
+def reconcile() -> bool:
+    # NOTE: In watch mode, the connection of the previous cycle is reused
+    if g.api_manager is None:
+        with g.metrics.phase("connect"):
+            # Connect to the API
+            g.target.api_manager = APIManager()
+            # Check if API is available
+            g.api_manager.check_api_availability()
 
-    # Connect to the API
-    g.api_manager = APIManager()
-    # Check if API is available
-    g.api_manager.check_api_availability()
+    # Continue an interrupted run from its journal, without discovering datasets and fetching all shares again
+    if g.args.resume:
+        resume_succeeded = resume_from_journal()
+        if resume_succeeded is not None:
+            return resume_succeeded
 
-    # Extract relevant datasets using the API, or from output of zfs list -o POOL_NAME; See the help page for available options
-    relevant_datasets = obtain_list_of_relevant_datasets()
-    if relevant_datasets is None:
-        return False
-    
-    # Obtain all current NFS shares
-    shares_query_response = g.api_manager.get_shares_query_response()
-    all_shares = NFSShare.list_from_api_response(shares_query_response)
+    # Obtain the current NFS shares in the background, while the relevant datasets are discovered.
+    # With a valid state snapshot, only the shares of datasets that changed since the last run are fetched afterwards
+    state_snapshot = load_state_snapshot()
+    with ThreadPoolExecutor(max_workers=1) as background_executor:
+        prefetched_shares_future = background_executor.submit(copy_context().run, prefetch_present_shares, state_snapshot)
+
+        # Extract relevant datasets using the API, or from output of zfs list -o POOL_NAME; See the help page for available options
+        with g.metrics.phase("discovery"):
+            relevant_datasets = obtain_list_of_relevant_datasets()
+        if relevant_datasets is None:
+            return False
+        if g.args.explain_options:
+            g.share_options_table.print_explanation(relevant_datasets)
+
+        with g.metrics.phase("share_fetch"):
+            state_snapshot, all_shares, datasets_to_reconcile = obtain_present_shares(state_snapshot, prefetched_shares_future, relevant_datasets)
     
-    # Check for non-automatically created shares that are relevant
-    # to query the user whether they want them deleted
-    non_automatic_relevant_shares = [
-        share for share in all_shares
-            if share.is_relevant(relevant_datasets)
-                and not share.is_automatically_created()
-    ]
-    if non_automatic_relevant_shares:
-        handle_non_automatic_relevant_shares(non_automatic_relevant_shares)
-
-    # Remove all automatically created shares that are no longer relevant
-    # NOTE: This is both for removing outdated shares that are no longer required and those that might be broken
-    deletion_succeeded, relevant_automatically_created_shares = delete_irrelevant_automatically_created_shares(all_shares, relevant_datasets)
+    with g.metrics.phase("reconcile"):
+        # Index all shares once, so that the following phases do not need to scan the share and dataset lists
+        index = ReconciliationIndex(all_shares, relevant_datasets)
+
+        # Determine which shares actually need to be created, updated or deleted
+        plan = ReconciliationPlan.from_index(index, datasets_to_reconcile)
+    plan.print_summary()
+    if g.args.plan_only:
+        return True
+    start_journal(plan)
+
+    with g.metrics.phase("delete"):
+        # Check for non-automatically created shares that are relevant
+        # to query the user whether they want them deleted
+        deleted_non_automatic_shares = []
+        if plan.non_automatic_relevant_shares:
+            deleted_non_automatic_shares = handle_non_automatic_relevant_shares(plan.non_automatic_relevant_shares)
+
+        # Remove all automatically created shares that are no longer relevant
+        # NOTE: This is both for removing outdated shares that are no longer required and those that might be broken
+        deletion_succeeded = delete_irrelevant_automatically_created_shares(plan.shares_to_delete)
     if not deletion_succeeded:
+        discard_state_snapshot()
         return False
     
-    # Update already present automatically created shares, if user wants to
-    update_present_recursive_shares(relevant_automatically_created_shares)
+    # Update already present automatically created shares that differ from the config, if user wants to
+    with g.metrics.phase("update"):
+        update_succeeded = update_present_recursive_shares(plan.share_updates)
 
     # Create all relevant remaining shares
-    dataset_path_names_with_present_shares = [share.path_name for share in relevant_automatically_created_shares]
-    datasets_needing_new_shares = [dataset for dataset in relevant_datasets if dataset not in dataset_path_names_with_present_shares]
-    if not create_recursive_shares(datasets_needing_new_shares):
+    with g.metrics.phase("create"):
+        creation_succeeded = create_recursive_shares(plan.shares_to_create)
+    if not creation_succeeded:
+        discard_state_snapshot()
         return False
+
+    # Remember the reconciled state, so that the next run only needs to handle changes
+    deletions_skipped = g.args.assume_no_deletes and len(plan.shares_to_delete) > 0
+    if update_succeeded and not deletions_skipped:
+        save_state_snapshot(state_snapshot, all_shares, plan.shares_to_delete + deleted_non_automatic_shares, plan, relevant_datasets)
+    else:
+        discard_state_snapshot()
+    if update_succeeded:
+        finish_journal()
     
     return True
 
+def main(_args, _config) -> bool:
+    set_headless(_args.headless or _args.watch)
+    targets = create_target_contexts(_args, _config)
+    try:
+        if _args.watch:
+            return watch_targets(targets, reconcile, lambda: export_metrics(_args, targets))
+        try:
+            return run_targets(targets, reconcile)
+        finally:
+            export_metrics(_args, targets)
+    finally:
+        for target in targets:
+            target.close_api_manager()
+
 if __name__ == "__main__":
     _args = obtain_args()
+    set_headless(_args.headless or _args.watch)
     _config = obtain_config(_args)
-    if main(_args, _config):
+    succeeded = main(_args, _config)
+    if succeeded:
         print(f"{Fore.GREEN}Done.{Fore.RESET}")
     else:
-        print(f"{Fore.RED}Terminating.{Fore.RESET}")
\ No newline at end of file
+        print(f"{Fore.RED}Terminating.{Fore.RESET}")